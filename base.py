@@ -5,9 +5,14 @@ Intended to be subclassed, especially Models and Managers
 # Imports
 from __future__ import annotations
 
+import collections
+import itertools
+import json
 import math
+import os
 import typing
 
+import numpy as np
 import pygame
 
 # Typing definition to compress annotations
@@ -18,6 +23,9 @@ class Point:
         Can be constructed with two numerical parameters, or a single two-element numerical tuple
     """
 
+    # Only the position is stored, avoiding a per-instance __dict__
+    __slots__ = ("position",)
+
     def __init__(self, x: typing.Union[Pair, float], y: float = None):
         if y is None:
             # Take single parameter as component pair
@@ -91,6 +99,98 @@ class Point:
     def __rtruediv__(self, other: float):
         return self.__truediv__(other)
 
+class PointArray:
+    """Contiguous array-backed collection of two dimensional points\n
+        Arithmetic works like Point, applied to every point at once and broadcasting with
+        Points, tuples, scalars, other PointArrays or numpy arrays.
+        Unlike Point, whose reflected - and / ignore operand order, reflected operations keep it,
+        so c - points is (c - x, c - y) and c / points is (c/x, c/y).
+        Converts to an (n, 2) numpy array without copying, so can be passed to Panel methods
+    """
+
+    __slots__ = ("array",)
+
+    def __init__(self, points: typing.Union[PointArray, np.ndarray, typing.Sequence[Pair]]):
+        if isinstance(points, PointArray):
+            points = points.array
+        self.array = np.asarray(points, dtype=float).reshape(-1, 2)
+
+    @staticmethod
+    def _operand(other):
+        """Returns the numpy equivalent of an arithmetic operand"""
+        if isinstance(other, PointArray):
+            return other.array
+        if isinstance(other, Point):
+            return np.asarray(other.position, dtype=float)
+        return np.asarray(other, dtype=float)
+
+    @staticmethod
+    def _scalar(other):
+        """Returns a scalar or per-point column operand for multiplication and division"""
+        other = PointArray._operand(other)
+        return other[:, None] if other.ndim == 1 else other
+
+    @property
+    def x(self) -> np.ndarray:
+        """First component of every point, as a view"""
+        return self.array[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        """Second component of every point, as a view"""
+        return self.array[:, 1]
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None or self.array.dtype == dtype:
+            return self.array.copy() if copy else self.array
+        return self.array.astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __getitem__(self, key):
+        """Returns a Point for an integer index, otherwise a PointArray view"""
+        if isinstance(key, (int, np.integer)):
+            return Point(*self.array[key].tolist())
+        return PointArray(self.array[key])
+
+    def __iter__(self) -> typing.Iterator[Point]:
+        return (Point(x, y) for x, y in self.array.tolist())
+
+    def __add__(self, other):
+        """Adds each component independently, to every point"""
+        return PointArray(self.array + self._operand(other))
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        """Subtracts each component independently, from every point"""
+        return PointArray(self.array - self._operand(other))
+
+    def __rsub__(self, other):
+        """Subtracts every point from the other operand, keeping operand order"""
+        return PointArray(self._operand(other) - self.array)
+
+    def __neg__(self):
+        """Negates each component of every point"""
+        return PointArray(-self.array)
+
+    def __mul__(self, other):
+        """Multiplies every point by a scalar, or each point by its own scalar"""
+        return PointArray(self.array * self._scalar(other))
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        """Divides every point by a scalar, or each point by its own scalar"""
+        return PointArray(self.array / self._scalar(other))
+
+    def __rtruediv__(self, other):
+        """Divides a scalar, or a scalar per point, by each component, keeping operand order"""
+        return PointArray(self._scalar(other) / self.array)
+
 class Panel:
     """Surface wrapper to provide additional functionality and abstractness
         All drawing methods are relative to the given origin based on orientation
@@ -114,10 +214,25 @@ class Panel:
         """
         return self.origin + Point(point[0] * self.orientation.x, point[1] * self.orientation.y)
 
+    def convert_array(self, points: np.ndarray) -> np.ndarray:
+        """Converts an (n, 2) array of theoretical points into Surface positions in one step\n
+            Vectorized equivalent of convert
+        """
+        return (
+            np.asarray(self.origin.position, dtype=float)
+            + np.asarray(points, dtype=float) * np.asarray(self.orientation.position, dtype=float)
+        )
+
     def clear(self, color: pygame.Color = pygame.Color(0, 0, 0)):
         """Clears the Panel to a specified blank color"""
         self.surface.fill(color)
 
+    def reset(self, origin: typing.Union[Point, Pair], orientation: typing.Union[Pair, Point]):
+        """Clears the Panel and gives it a new origin and orientation, for reuse in a new drawing"""
+        self.origin = Point(origin)
+        self.orientation = Point(orientation)
+        self.clear()
+
     def draw_line(self, start: typing.Union[Point, Pair], end: typing.Union[Point, Pair],
                   color: pygame.Color = pygame.Color(255, 255, 255)):
         """Provides an easier but limited interface to pygame.draw.line(self.surface, ...)"""
@@ -137,10 +252,195 @@ class Panel:
         # Draw border polygon
         pygame.draw.polygon(self.surface, borderColor, points, borderWidth)
 
+    def draw_polygons(self, points: np.ndarray, offsets: np.ndarray = None,
+                      colors=(127, 127, 127), borderWidth: float = 1,
+                      borderColor: pygame.Color = (255, 255, 255)):
+        """Draws many polygons, converting every point at once\n
+            points is an (n, k, 2) array of n polygons with k points each,
+            or a flat (m, 2) array where polygon i is rows offsets[i]:offsets[i + 1].
+            colors is a single color or one per polygon, a borderWidth of 0 skips the border pass.
+            Polygons with fewer than 3 points are drawn as lines in their color
+        """
+        points = np.asarray(points, dtype=float)
+        if offsets is None:
+            number, arity = points.shape[:2]
+            offsets = np.arange(number + 1) * arity
+            points = points.reshape(-1, 2)
+        offsets = np.asarray(offsets)
+
+        # Convert everything up front, then only slice lists in the loop
+        converted = self.convert_array(points).tolist()
+        colors = _colors(colors, len(offsets) - 1)
+
+        # Local references avoid attribute lookups per polygon
+        polygon, line, surface = pygame.draw.polygon, pygame.draw.line, self.surface
+        if (np.diff(offsets) >= 3).all():
+            # Only filled polygons, as in batches of a single kind, so skip the check per polygon
+            for start, end, color in zip(offsets[:-1].tolist(), offsets[1:].tolist(), colors):
+                vertices = converted[start:end]
+                polygon(surface, color, vertices)
+                if borderWidth:
+                    polygon(surface, borderColor, vertices, borderWidth)
+            return
+        for start, end, color in zip(offsets[:-1].tolist(), offsets[1:].tolist(), colors):
+            vertices = converted[start:end]
+            if end - start >= 3:
+                polygon(surface, color, vertices)
+                if borderWidth:
+                    polygon(surface, borderColor, vertices, borderWidth)
+            elif vertices:
+                line(surface, color, vertices[0], vertices[-1])
+
+    def draw_lines(self, segments: np.ndarray, colors=(255, 255, 255), width: int = 1):
+        """Draws many lines from an (n, 2, 2) array of start and end points, converted at once\n
+            colors is a single color or one per line
+        """
+        segments = np.asarray(segments, dtype=float)
+        converted = self.convert_array(segments.reshape(-1, 2)).reshape(-1, 2, 2).tolist()
+        line, surface = pygame.draw.line, self.surface
+        for (start, end), color in zip(converted, _colors(colors, len(converted))):
+            line(surface, color, start, end, width)
+
     def display(self, surface: pygame.Surface, position: typing.Tuple[int, int]):
         """Displays the panel on a surface by blitting it"""
         surface.blit(self.surface, position)
 
+def _colors(colors, number: int) -> typing.Iterable:
+    """Returns an iterable of one color per primitive from a single color or an (n, 3) array"""
+    if np.ndim(colors) == 1:
+        return itertools.repeat(tuple(colors), number)
+    return np.asarray(colors).tolist()
+
+class PanelBuffer:
+    """Pair of Panels drawn on alternately, so one can be shown while the other is redrawn\n
+        Backing surfaces are reused, and only reallocated when the requested size changes
+    """
+
+    def __init__(self):
+
+        # Both panels, created lazily, and the index of the most recently handed out one
+        self.panels = [None, None]
+        self.current = 0
+
+    def next(self, size: typing.Tuple[int, int], origin: typing.Union[Point, Pair] = Point(0, 0),
+             orientation: typing.Union[Pair, Point] = Point(1, 1)) -> Panel:
+        """Returns the other cleared Panel with the given size, origin and orientation"""
+        self.current = 1 - self.current
+        panel = self.panels[self.current]
+        if panel is None or panel.surface.get_size() != tuple(size):
+            # Size changed, so a new surface is needed
+            panel = Panel(pygame.Surface(size), origin, orientation)
+            self.panels[self.current] = panel
+        else:
+            panel.reset(origin, orientation)
+        return panel
+
+# Optional background color, where None renders text with a transparent background
+Background = typing.Optional[typing.Tuple[int, int, int]]
+
+class TextCache:
+    """Least recently used cache of rendered text Surfaces\n
+        Keyed on the string, font and colors, so unchanged text is only rendered once
+    """
+
+    def __init__(self, capacity: int = 256):
+
+        # Maximum number of surfaces kept, and the surfaces from least to most recently used
+        self.capacity = capacity
+        self._surfaces: collections.OrderedDict = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def render(self, text: str, font: pygame.font.Font, color: typing.Tuple[int, int, int],
+               background: Background = None) -> pygame.Surface:
+        """Returns an antialiased Surface of the text, rendering it only if not cached"""
+        key = (text, font, tuple(color), None if background is None else tuple(background))
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, True, color, background)
+            self._surfaces[key] = surface
+            if len(self._surfaces) > self.capacity:
+                self._surfaces.popitem(last=False)
+        else:
+            self._surfaces.move_to_end(key)
+        return surface
+
+class Overlay:
+    """Draws text onto Panels for HUDs and debug readouts\n
+        Fonts are loaded once, and labels are rendered once through a TextCache
+    """
+
+    def __init__(self, capacity: int = 256, pathCache: str = None):
+
+        # Loaded fonts by (name, size)
+        self._fonts: typing.Dict[typing.Tuple[str, int], pygame.font.Font] = {}
+        # Rendered labels
+        self.cache = TextCache(capacity)
+
+        # JSON file remembering the font file of each system font name between runs, if any
+        self.pathCache = pathCache
+        # Font file of each name, None for pygame's default font, read from pathCache when needed
+        self._paths: typing.Optional[typing.Dict[str, typing.Optional[str]]] = None
+
+    def path(self, name: str) -> typing.Optional[str]:
+        """Returns the file of the system font of the given name, or None for the default font
+        Finding a font scans the system fonts, so found files are kept in the path cache
+        """
+        if self._paths is None:
+            self._paths = {}
+            if self.pathCache is not None:
+                try:
+                    with open(self.pathCache, encoding="utf-8") as file:
+                        self._paths = json.load(file)
+                except (OSError, ValueError):
+                    pass
+        path = self._paths.get(name)
+        # Fonts may have been removed since they were cached
+        if name not in self._paths or (path is not None and not os.path.exists(path)):
+            path = self._paths[name] = pygame.font.match_font(name)
+            if self.pathCache is not None:
+                try:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.pathCache)), exist_ok=True)
+                    with open(self.pathCache, "w", encoding="utf-8") as file:
+                        json.dump(self._paths, file, indent=2)
+                except OSError:
+                    # Read only locations just scan again next run
+                    pass
+        return path
+
+    def font(self, name: str, size: int) -> pygame.font.Font:
+        """Returns the system font of the given name and size, loading it the first time"""
+        font = self._fonts.get((name, size))
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = self._fonts[(name, size)] = pygame.font.Font(self.path(name), size)
+        return font
+
+    def text(self, panel: Panel, text: str, position: typing.Union[Point, Pair],
+             name: str = "default", size: int = 30,
+             color: typing.Tuple[int, int, int] = (255, 255, 255),
+             background: Background = None) -> pygame.Rect:
+        """Draws text that rarely changes with its top left at a Panel position,
+        returning its area. Rendered once and then reused from the cache
+        """
+        surface = self.cache.render(text, self.font(name, size), color, background)
+        return panel.surface.blit(surface, panel.convert(position).position)
+
+    def readout(self, panel: Panel, text: str, position: typing.Union[Point, Pair],
+                name: str = "default", size: int = 30,
+                color: typing.Tuple[int, int, int] = (255, 255, 255),
+                background: Background = None) -> pygame.Rect:
+        """Draws text that changes often with its top left at a Panel position, returning its area
+        Rendered directly rather than cached, so values seen once do not evict labels
+        """
+        surface = self.font(name, size).render(text, True, color, background)
+        return panel.surface.blit(surface, panel.convert(position).position)
+
+# Shared overlay, so every HUD reuses the same fonts and rendered text
+overlay = Overlay()
+
 def radial(length: float, angle: float) -> Point:
     """Returns a Point representing the position reached\n
        by travelling the given distance at the given angle in radians.\n
@@ -149,29 +449,123 @@ def radial(length: float, angle: float) -> Point:
     # Standard vector calculations for horizontal and vertical
     return Point(length * math.cos(angle), length * math.sin(angle))
 
+def radial_array(lengths: typing.Union[float, np.ndarray], angles: np.ndarray) -> PointArray:
+    """Returns a PointArray of the positions reached by travelling each length at each angle\n
+       Vectorized equivalent of radial, broadcasting lengths against angles
+    """
+    lengths, angles = np.broadcast_arrays(
+        np.asarray(lengths, dtype=float), np.asarray(angles, dtype=float)
+    )
+    return PointArray(np.stack((lengths * np.cos(angles), lengths * np.sin(angles)), axis=-1))
+
 class Model:
     """Abstrac Class representing a mathematical model, designed to be represented on a Panel"""
 
+    def __init__(self):
+
+        # Panels handed out by canvas, created on first use
+        self._buffer: typing.Optional[PanelBuffer] = None
+        # Panel returned by render, and the fingerprint it was drawn with
+        self._rendered: typing.Optional[Panel] = None
+        self._renderedFingerprint: typing.Hashable = None
+
     def update(self):
-        """Updates the model to the next stage, if the model is dynamic"""
+        """Updates the model to the next stage, if the model is dynamic
+        Called at a fixed rate by the main loop, independent of how often the Model is drawn
+        """
+        return
+
+    def interpolate(self, alpha: float):
+        """Prepares the model to be drawn alpha (0 to 1) of the way from its previous to its
+        current stage, so motion looks smooth when drawing faster than updating.
+        The next update should start from the current stage, not the interpolated one
+        """
         return
 
-    def visual(self) -> Panel:
-        """Returns a Panel containing a visual representation of the Model"""
+    def visual(self, panel: Panel = None) -> Panel:
+        """Returns a Panel containing a visual representation of the Model
+        Draws on the given panel if provided, otherwise on one from canvas()
+        """
         raise NotImplementedError
 
+    def canvas(self, size: typing.Tuple[int, int], origin: typing.Union[Point, Pair],
+               orientation: typing.Union[Pair, Point], panel: Panel = None) -> Panel:
+        """Returns a cleared Panel for visual() to draw on, with the given origin and orientation
+        Uses the given panel if provided, otherwise one from a PanelBuffer owned by the Model,
+        so repeated visuals reuse the same two surfaces
+        """
+        if panel is None:
+            if self._buffer is None:
+                self._buffer = PanelBuffer()
+            panel = self._buffer.next(size, origin, orientation)
+        else:
+            panel.reset(origin, orientation)
+        if panel is self._rendered:
+            # The panel kept by render is being drawn over, so it must be drawn again
+            self._renderedFingerprint = None
+        return panel
+
+    def fingerprint(self) -> typing.Hashable:
+        """Returns a value that changes whenever the result of visual() would change
+        Returning None (the default) disables render caching
+        """
+        return None
+
+    def render(self) -> Panel:
+        """Returns visual(), reusing the previous Panel if the fingerprint has not changed
+        The returned Panel may be shared between frames, so it should not be drawn on
+        """
+        # The base fingerprint is always None, but subclasses return values to enable caching
+        fingerprint = self.fingerprint() #pylint: disable=assignment-from-none
+        if fingerprint is None or fingerprint != self._renderedFingerprint:
+            self._rendered = self.visual()
+            self._renderedFingerprint = fingerprint
+        return self._rendered
+
 class Manager:
     """Abstract Class that gets pygame events and screen and manages a Model on it"""
 
+    # Pygame modules the Manager uses beyond the display, initialized by prepare
+    subsystems: typing.Tuple[str, ...] = ()
+    # (name, size) of the overlay fonts the Manager draws with, loaded by prepare
+    fonts: typing.Tuple[typing.Tuple[str, int], ...] = ()
+
+    @classmethod
+    def prepare(cls):
+        """Initializes the pygame modules and loads the fonts the Manager needs,
+        so the first frame does not pay for them. The display is initialized separately
+        """
+        for subsystem in cls.subsystems:
+            getattr(pygame, subsystem).init()
+        for name, size in cls.fonts:
+            overlay.font(name, size)
+
     def __init__(self, model: Model, screen: pygame.Surface):
 
         # Reference model and screen for later use
         self.model = model
         self.screen = screen
 
-    def update(self, events, keyboard):
+        # Color the screen is cleared to, for erasing stale areas
+        self.background = pygame.Color(0, 0, 0)
+        # Whether the screen still holds everything drawn by the previous update
+        self.valid = False
+
+    def invalidate(self):
+        """Notes that the screen was cleared or overwritten, so the next update must redraw fully"""
+        self.valid = False
+
+    def step(self, events, keyboard):
+        """Advances the Model by one fixed timestep, with the given events and keyboard press state
+        The manager should use the events to update the model here, rather than in update,
+        so input is applied at the simulation rate
+        """
+        self.model.update()
+
+    def update(self, events, keyboard) -> typing.Optional[typing.List[pygame.Rect]]:
         """Updates the Manager with the given events and keyboard press state
-        The manager should use the events to update the model,
-        and then redraw the updated model
+        Called once per drawn frame, after any steps, and should redraw the model.
+        Returns the list of screen rectangles changed, erasing anything stale itself,
+        or None if it drew the whole screen, which is then cleared before every update
         """
         raise NotImplementedError
@@ -0,0 +1,289 @@
+"""Headless benchmark of Model rendering along scripted camera paths
+
+Renders standard scenes through SDL's dummy video driver and reports frame times as JSON, e.g.
+    python bench.py --scene grid --size 1000 --frames 300 --output before.json
+    python bench.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+
+# Render without a display, and keep pygame's import banner out of the JSON on stdout
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np #pylint: disable=wrong-import-position
+import pygame #pylint: disable=wrong-import-position
+
+import projection #pylint: disable=wrong-import-position
+import stargon #pylint: disable=wrong-import-position
+from config import config #pylint: disable=wrong-import-position
+from frameprofile import profiler #pylint: disable=wrong-import-position
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Metrics compared between runs, where a larger value is worse
+COMPARED = ("frame_ms.p50", "frame_ms.p95", "frame_ms.p99", "frame_ms.mean", "peak_rss_kb")
+
+def observer(window: typing.Tuple[int, int]) -> projection.Observer:
+    """Returns an Observer with the configured focal length and the given window"""
+    return projection.Observer(
+        origin=pygame.Vector3(0, 0, 0),
+        orientation=projection.Rotation(pygame.Vector3(0, 0, 0), 0),
+        focal=config["screen"]["focal"], window=window
+    )
+
+def grid_scene(model: projection.Projection, size: int, rng: np.random.Generator) -> float: #pylint: disable=unused-argument
+    """Fills the model with a cubic grid of <size> wire cubes, returning the scene radius"""
+    side = math.ceil(size ** (1 / 3))
+    spacing = 300
+    offset = (side - 1) * spacing / 2
+    for index in range(size):
+        x, y, z = index % side, index // side % side, index // side // side
+        model.add_wire_cube(
+            pygame.Vector3(x * spacing - offset, y * spacing - offset, z * spacing - offset), 100
+        )
+    return side * spacing
+
+def soup_scene(model: projection.Projection, size: int, rng: np.random.Generator) -> float:
+    """Fills the model with <size> random colored triangles, returning the scene radius"""
+    radius = 200 * size ** (1 / 3)
+    centers = rng.uniform(-radius, radius, (size, 1, 3))
+    model.add_polygons(
+        centers + rng.uniform(-100, 100, (size, 3, 3)),
+        rng.integers(0, 256, (size, 3))
+    )
+    return 2 * radius
+
+# Projection scenes by name
+SCENES = {
+    "grid": grid_scene,
+    "soup": soup_scene,
+}
+
+def orbit(viewer: projection.Observer, radius: float, progress: float) -> None:
+    """Places the viewer on a circle around the origin, looking at it
+    progress from 0 to 1 covers one full orbit, with a gentle vertical bob
+    """
+    angle = 2 * math.pi * progress
+    distance = 2 * radius
+    viewer.origin = pygame.Vector3(
+        distance * math.sin(angle), radius / 4 * math.sin(2 * angle), -distance * math.cos(angle)
+    )
+    # Yawing by the orbit angle turns the viewer back towards the origin
+    viewer.orientation = projection.Rotation(pygame.Vector3(0, 1, 0), angle)
+
+def percentiles(samples: typing.List[float]) -> typing.Dict[str, float]:
+    """Returns summary statistics of frame times in milliseconds"""
+    samples = np.array(samples) * 1000
+    return {
+        "p50": float(np.percentile(samples, 50)),
+        "p95": float(np.percentile(samples, 95)),
+        "p99": float(np.percentile(samples, 99)),
+        "mean": float(samples.mean()),
+        "max": float(samples.max()),
+    }
+
+def peak_rss() -> typing.Optional[int]:
+    """Returns the peak resident set size of the process in kilobytes, if known"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes rather than kilobytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# Model module and Manager of each scene, started like main.py when measuring startup
+MANAGERS = {"stargon": ("stargon", "StargonManager")}
+DEFAULT_MANAGER = ("projection", "ProjectionManager")
+
+def startup(scene: str) -> float:
+    """Returns the seconds a fresh interpreter takes to import the model of a scene,
+    open a window and prepare its Manager, as main.py does before the first frame
+    """
+    module, manager = MANAGERS.get(scene, DEFAULT_MANAGER)
+    code = (
+        f"import pygame, base, {module}; from config import config; "
+        "pygame.display.init(); pygame.display.set_mode((1, 1)); "
+        f"base.overlay.pathCache = config['fonts']['cache']; {module}.{manager}.prepare()"
+    )
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return time.perf_counter() - start
+
+def cached(model: projection.Projection, polygons: int) -> projection.Projection:
+    """Returns a Projection with the same views loaded from a scene cache of the model
+    Raises ValueError if the cache does not hold every polygon of the model
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.scene")
+        model.save(path)
+        loaded = projection.Projection(
+            model.observers, culling=model.index is not None, ordering=model.ordering,
+            backend=model.backend, workers=model.rasterizer.workers, tile=model.rasterizer.tile
+        )
+        loaded.load(path)
+    if loaded.polygon_count() != polygons:
+        raise ValueError(f"Scene cache holds {loaded.polygon_count()} of {polygons} polygons")
+    return loaded
+
+def run(arguments: argparse.Namespace) -> typing.Dict:
+    """Builds the requested scene, renders it along its path, and returns the results"""
+    started = startup(arguments.scene)
+    pygame.display.init()
+    window = tuple(arguments.window)
+    screen = pygame.display.set_mode(window)
+    rng = np.random.default_rng(arguments.seed)
+
+    # Build the scene, and a function moving along the path
+    start = time.perf_counter()
+    if arguments.scene == "stargon":
+        model = stargon.Stargon(min(window) // 2, arguments.size)
+        polygons = arguments.size
+        radius = model.radius
+        def step(progress):
+            # Breathe the radius so each frame differs
+            model.radius = max(1, int(radius * (0.75 + 0.25 * math.cos(2 * math.pi * progress))))
+    else:
+        # Split screen views side by side, following each other around the orbit
+        views = [
+            observer((window[0] // arguments.views, window[1])) for _ in range(arguments.views)
+        ]
+        model = projection.Projection(
+            views, culling=not arguments.no_culling, ordering=arguments.ordering,
+            backend=arguments.backend, workers=arguments.workers, tile=arguments.tile
+        )
+        radius = SCENES[arguments.scene](model, arguments.size, rng)
+        polygons = model.polygon_count()
+        if arguments.cache:
+            model = cached(model, polygons)
+        def step(progress):
+            for index, view in enumerate(views):
+                orbit(view, radius, progress + index / (8 * arguments.views))
+    build = time.perf_counter() - start
+
+    # Render along the path, timing each frame including presentation
+    profiler.enabled = arguments.profile
+    profiler.history = arguments.frames
+    profiler.reset()
+    times = []
+    for frame in range(arguments.warmup + arguments.frames):
+        step(frame / max(arguments.frames, 1))
+        start = time.perf_counter()
+        images = [model.visual()] if arguments.views == 1 else model.visuals()
+        screen.fill(config["screen"]["color"])
+        for index, image in enumerate(images):
+            image.display(screen, (index * window[0] // len(images), 0))
+        pygame.display.flip()
+        if frame >= arguments.warmup:
+            times.append(time.perf_counter() - start)
+        elif frame == arguments.warmup - 1:
+            profiler.reset()
+
+    pygame.display.quit()
+    total = sum(times)
+    return {
+        "scene": arguments.scene,
+        "size": arguments.size,
+        "polygons": polygons,
+        "settings": {
+            "frames": arguments.frames, "warmup": arguments.warmup, "window": list(window),
+            "seed": arguments.seed, "backend": arguments.backend, "ordering": arguments.ordering,
+            "culling": not arguments.no_culling, "workers": arguments.workers,
+            "tile": arguments.tile,
+            "views": arguments.views, "cache": arguments.cache,
+        },
+        "startup_s": started,
+        "build_s": build,
+        "frame_ms": percentiles(times),
+        "fps": len(times) / total,
+        "polygons_per_s": polygons * len(times) / total,
+        "peak_rss_kb": peak_rss(),
+        "stages_ms": profiler.stats() if arguments.profile else None,
+        "platform": {
+            "python": platform.python_version(), "numpy": np.__version__,
+            "pygame": pygame.version.ver, "machine": platform.machine(),
+        },
+    }
+
+def lookup(results: typing.Dict, key: str):
+    """Returns a nested result given a dotted key, or None if missing"""
+    for part in key.split("."):
+        if not isinstance(results, dict) or part not in results:
+            return None
+        results = results[part]
+    return results
+
+def compare(before: typing.Dict, after: typing.Dict, threshold: float) -> bool:
+    """Prints the change of each compared metric, returning whether any regressed past threshold"""
+    regressed = False
+    for key in COMPARED:
+        old, new = lookup(before, key), lookup(after, key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{key:16} {old:12.3f} -> {new:12.3f} ({change:+.1%}){flag}")
+    return regressed
+
+def main():
+    """Parses command line arguments and runs or compares benchmarks"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scene", choices=sorted(SCENES) + ["stargon"], default="grid")
+    parser.add_argument("--size", type=int, default=125,
+                        help="cubes for grid, triangles for soup, order for stargon")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--window", type=int, nargs=2, default=config["screen"]["dimensions"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=projection.Projection.BACKENDS, default="painter")
+    parser.add_argument("--ordering", choices=projection.Projection.ORDERINGS, default="depth")
+    parser.add_argument("--workers", type=int, default=config["render"]["workers"])
+    parser.add_argument("--tile", type=int, default=config["render"]["tile"],
+                        help="side of the square tiles zbuffer workers rasterize")
+    parser.add_argument("--views", type=int, default=1,
+                        help="observers rendered together as a split screen")
+    parser.add_argument("--no-culling", action="store_true")
+    parser.add_argument("--cache", action="store_true",
+                        help="render the scene after saving and loading it through a scene cache")
+    parser.add_argument("--profile", action="store_true", help="include per-stage timings")
+    parser.add_argument("--output", help="file to write JSON results to instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative increase counted as a regression when comparing")
+    arguments = parser.parse_args()
+
+    if arguments.scene == "stargon" and arguments.views != 1:
+        parser.error("stargon only has a single view")
+
+    if arguments.compare:
+        with open(arguments.compare[0], encoding="utf-8") as before, \
+             open(arguments.compare[1], encoding="utf-8") as after:
+            regressed = compare(json.load(before), json.load(after), arguments.threshold)
+        sys.exit(1 if regressed else 0)
+
+    results = json.dumps(run(arguments), indent=2, sort_keys=True)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            output.write(results + "\n")
+    else:
+        print(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""Binary space partitioning of 3D polygons, for painter's algorithm ordering without sorting"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+import scene
+
+# Distance within which a point is considered to lie on a plane
+EPSILON = 1e-6
+
+# Number of polygon planes tried as splitters for each node
+CANDIDATES = 8
+
+def planes(vertices: np.ndarray, offsets: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns the unit (normals, offsets) of the plane of each polygon using Newell's method
+    Lines, points and collinear polygons have a zero normal
+    """
+    following = vertices[scene.adjacent(offsets)]
+    normals = np.add.reduceat(np.cross(vertices - following, vertices + following), offsets[:-1])
+    length = np.linalg.norm(normals, axis=1)
+    # Anything too small to give a reliable direction has no plane
+    planar = length > EPSILON * scene.sizes(vertices, offsets) ** 2
+    normals[planar] /= length[planar, None]
+    normals[~planar] = 0
+    # Plane passes through the mean point of each polygon
+    counts = np.diff(offsets)
+    centers = np.add.reduceat(vertices, offsets[:-1]) / counts[:, None]
+    return normals, -(normals * centers).sum(axis=1)
+
+def _split(points: np.ndarray, distance: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Splits a convex polygon (or line) by a plane, returning the (front, back) pieces"""
+    front, back = [], []
+    # Lines only have one edge, polygons wrap around
+    edges = len(points) if len(points) > 2 else len(points) - 1
+    for i, point in enumerate(points):
+        if distance[i] >= -EPSILON:
+            front.append(point)
+        if distance[i] <= EPSILON:
+            back.append(point)
+        if i < edges:
+            j = (i + 1) % len(points)
+            if (distance[i] > EPSILON and distance[j] < -EPSILON) or \
+               (distance[i] < -EPSILON and distance[j] > EPSILON):
+                # Edge crosses the plane, so both pieces share the crossing point
+                crossing = point + (points[j] - point) * (distance[i] / (distance[i] - distance[j]))
+                front.append(crossing)
+                back.append(crossing)
+    return np.array(front), np.array(back)
+
+class _Fragments:
+    """Flat arrays of polygon pieces, their source handles and their planes"""
+
+    def __init__(self, vertices, offsets, sources, normals, distances):
+        self.vertices = vertices
+        self.offsets = offsets
+        self.sources = sources
+        self.normals = normals
+        self.distances = distances
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def select(self, mask: np.ndarray) -> _Fragments:
+        """Returns the fragments where mask is true"""
+        gather, offsets = scene.ranges(self.offsets[:-1][mask], np.diff(self.offsets)[mask])
+        return _Fragments(
+            self.vertices[gather], offsets,
+            self.sources[mask], self.normals[mask], self.distances[mask]
+        )
+
+    @staticmethod
+    def join(parts: typing.List[_Fragments]) -> _Fragments:
+        """Returns the concatenation of several sets of fragments"""
+        offsets = [np.zeros(1, dtype=np.intp)]
+        total = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + total)
+            total += part.offsets[-1]
+        return _Fragments(
+            np.concatenate([part.vertices for part in parts]).reshape(-1, 3),
+            np.concatenate(offsets),
+            np.concatenate([part.sources for part in parts]),
+            np.concatenate([part.normals for part in parts]).reshape(-1, 3),
+            np.concatenate([part.distances for part in parts]),
+        )
+
+class BSPTree:
+    """Binary space partitioning tree over a static set of polygons\n
+        Built once, then traversed back to front from any viewpoint in linear time.
+        Polygons crossing a splitting plane are cut, so each piece keeps the handle of its source.
+        Lines and points have no plane of their own, and when a node holds nothing planar
+        it is split along the median of its widest axis instead
+    """
+
+    def __init__(self, vertices: np.ndarray, offsets: np.ndarray, handles: np.ndarray):
+
+        vertices = np.asarray(vertices, dtype=float)
+        offsets = np.asarray(offsets, dtype=np.intp)
+        handles = np.asarray(handles, dtype=np.intp)
+
+        # Node planes and children (-1 for none)
+        self.normals = []
+        self.distances = []
+        self.front = []
+        self.back = []
+        # Fragments drawn at each node
+        self._pieces: typing.List[_Fragments] = []
+
+        if len(handles):
+            normals, distances = planes(vertices, offsets)
+            self._build(_Fragments(vertices, offsets, handles, normals, distances))
+
+        # Fragments of every node back to back, with the range belonging to each node
+        counts = [len(piece) for piece in self._pieces]
+        self.ranges = np.concatenate(([0], np.cumsum(counts, dtype=np.intp))).astype(np.intp)
+        if self._pieces:
+            fragments = _Fragments.join(self._pieces)
+            self.vertices, self.offsets, self.sources = (
+                fragments.vertices, fragments.offsets, fragments.sources
+            )
+        else:
+            self.vertices = np.empty((0, 3))
+            self.offsets = np.zeros(1, dtype=np.intp)
+            self.sources = np.empty(0, dtype=np.intp)
+        del self._pieces
+
+        self.normals = np.array(self.normals, dtype=float).reshape(-1, 3)
+        self.distances = np.array(self.distances, dtype=float)
+        self.front = np.array(self.front, dtype=np.intp)
+        self.back = np.array(self.back, dtype=np.intp)
+
+    def __len__(self) -> int:
+        """Number of nodes in the tree"""
+        return len(self.distances)
+
+    def _node(self) -> int:
+        """Appends an empty node, returning its index"""
+        self.normals.append(np.zeros(3))
+        self.distances.append(0.0)
+        self.front.append(-1)
+        self.back.append(-1)
+        self._pieces.append(None)
+        return len(self.distances) - 1
+
+    @staticmethod
+    def _choose(fragments: _Fragments) -> typing.Optional[typing.Tuple[np.ndarray, float]]:
+        """Returns a splitting plane for the fragments, or None if they cannot be split"""
+        planar = np.flatnonzero(fragments.normals.any(axis=1))
+
+        if len(planar):
+            # Try a spread of polygon planes, preferring few splits and then balance
+            spread = np.linspace(0, len(planar) - 1, min(CANDIDATES, len(planar)))
+            candidates = planar[spread.astype(int)]
+            best, bestScore = None, None
+            for candidate in candidates:
+                normal, distance = fragments.normals[candidate], fragments.distances[candidate]
+                side = fragments.vertices @ normal + distance
+                low = np.minimum.reduceat(side, fragments.offsets[:-1])
+                high = np.maximum.reduceat(side, fragments.offsets[:-1])
+                splits = np.count_nonzero((low < -EPSILON) & (high > EPSILON))
+                balance = abs(np.count_nonzero(low >= -EPSILON) - np.count_nonzero(high <= EPSILON))
+                score = splits * len(fragments) + balance
+                if bestScore is None or score < bestScore:
+                    best, bestScore = (normal, distance), score
+            return best
+
+        # Nothing planar, so split at the median center along the widest axis
+        counts = np.diff(fragments.offsets)
+        centers = np.add.reduceat(fragments.vertices, fragments.offsets[:-1]) / counts[:, None]
+        axis = int(np.argmax(centers.max(axis=0) - centers.min(axis=0)))
+        if centers[:, axis].max() - centers[:, axis].min() <= EPSILON:
+            return None
+        normal = np.zeros(3)
+        normal[axis] = 1
+        return normal, -float(np.median(centers[:, axis]))
+
+    def _build(self, fragments: _Fragments) -> None:
+        """Builds the tree iteratively from the root"""
+        root = self._node()
+        stack = [(root, fragments)]
+        while stack:
+            node, fragments = stack.pop()
+
+            plane = self._choose(fragments) if len(fragments) > 1 else None
+            if plane is None:
+                # Leaf holding whatever is left
+                self._pieces[node] = fragments
+                continue
+            normal, distance = plane
+            self.normals[node], self.distances[node] = normal, distance
+
+            # Classify every fragment against the plane at once
+            side = fragments.vertices @ normal + distance
+            low = np.minimum.reduceat(side, fragments.offsets[:-1])
+            high = np.maximum.reduceat(side, fragments.offsets[:-1])
+            coplanar = (low >= -EPSILON) & (high <= EPSILON)
+            front = (low >= -EPSILON) & ~coplanar
+            back = (high <= EPSILON) & ~coplanar
+            straddling = ~(coplanar | front | back)
+
+            # Cut the straddling fragments into a piece for each side
+            frontParts, backParts = [fragments.select(front)], [fragments.select(back)]
+            for index in np.flatnonzero(straddling):
+                start, end = fragments.offsets[index], fragments.offsets[index + 1]
+                ahead, behind = _split(fragments.vertices[start:end], side[start:end])
+                for parts, points in ((frontParts, ahead), (backParts, behind)):
+                    parts.append(_Fragments(
+                        points, np.array((0, len(points)), dtype=np.intp),
+                        fragments.sources[index:index + 1],
+                        fragments.normals[index:index + 1], fragments.distances[index:index + 1]
+                    ))
+            ahead, behind = _Fragments.join(frontParts), _Fragments.join(backParts)
+
+            # No progress means everything left is kept together at this node
+            if not coplanar.any() and (not len(ahead) or not len(behind)):
+                self._pieces[node] = fragments
+                continue
+
+            self._pieces[node] = fragments.select(coplanar)
+            for parts, children in ((ahead, self.front), (behind, self.back)):
+                if len(parts):
+                    child = self._node()
+                    children[node] = child
+                    stack.append((child, parts))
+
+    def _nodes(self, eye: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the node indices ordered from furthest to nearest to eye,
+        and whether the eye is in front of each node plane
+        """
+        # Side of every node plane the eye is on
+        ahead = (self.normals @ np.asarray(eye, dtype=float) + self.distances) >= 0
+        front, back = self.front.tolist(), self.back.tolist()
+
+        # In-order traversal, visiting the far side first; negative entries emit a node
+        nodes = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                nodes.append(~node)
+                continue
+            far, near = (back[node], front[node]) if ahead[node] else (front[node], back[node])
+            if near >= 0:
+                stack.append(near)
+            stack.append(~node)
+            if far >= 0:
+                stack.append(far)
+        return np.array(nodes, dtype=np.intp), ahead
+
+    def order(self, eye: np.ndarray) -> np.ndarray:
+        """Returns the indices of every fragment ordered from furthest to nearest to eye"""
+        if not len(self):
+            return np.empty(0, dtype=np.intp)
+
+        # Expand the node order into the fragment ranges of each node
+        nodes, _ = self._nodes(eye)
+        return scene.ranges(self.ranges[nodes], self.ranges[nodes + 1] - self.ranges[nodes])[0]
+
+    def place(self, vertices: np.ndarray,
+              offsets: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the node each polygon settles at when pushed down the tree without cutting it,
+        and its side there: 1 or -1 for an empty front or back child, 0 for crossing the plane
+        """
+        number = len(offsets) - 1
+        nodes = np.zeros(number, dtype=np.intp)
+        sides = np.zeros(number, dtype=np.intp)
+        active = np.arange(number) if len(self) else np.empty(0, dtype=np.intp)
+        counts = np.diff(offsets)
+        # Descend every unsettled polygon one level at a time
+        while len(active):
+            gather, local = scene.ranges(offsets[active], counts[active])
+            node = nodes[active]
+            owner = np.repeat(node, counts[active])
+            side = (vertices[gather] * self.normals[owner]).sum(axis=1) + self.distances[owner]
+            low = np.minimum.reduceat(side, local[:-1])
+            high = np.maximum.reduceat(side, local[:-1])
+            front = (low >= -EPSILON) & (high > EPSILON)
+            back = (high <= EPSILON) & (low < -EPSILON)
+            child = np.where(front, self.front[node], np.where(back, self.back[node], -1))
+            # Crossing (or on) the plane, or heading into an empty child, settles the polygon
+            sides[active] = np.where(front, 1, np.where(back, -1, 0))
+            moving = child >= 0
+            nodes[active[moving]] = child[moving]
+            active = active[moving]
+        return nodes, sides
+
+    def merge(self, eye: np.ndarray, vertices: np.ndarray, offsets: np.ndarray,
+              depth: np.ndarray) -> np.ndarray:
+        """Returns every fragment and extra polygon ordered from furthest to nearest to eye
+        Indices below len(sources) are fragments, and the rest are extra polygons offset by it.
+        Extra polygons are placed among the fragments by pushing them down the tree, and
+        ones settling in the same place are ordered by decreasing depth
+        """
+        fragments = len(self.sources)
+        if not len(self):
+            return fragments + np.argsort(-np.asarray(depth), kind="stable")
+
+        # Rank of each node, drawn between whatever sits in its far and near empty children
+        nodes, ahead = self._nodes(eye)
+        rank = np.empty(len(self), dtype=np.intp)
+        rank[nodes] = np.arange(len(nodes))
+        owners = np.repeat(np.arange(len(self)), np.diff(self.ranges))
+        keys = 3 * rank[owners] + 1
+
+        placed, sides = self.place(vertices, offsets)
+        # Far children come before the node, near ones after, crossing ones with the node
+        facing = np.where(ahead[placed], 1, -1)
+        extraKeys = 3 * rank[placed] + 1 + sides * facing
+
+        # Fragments keep their tree order, and go before extra polygons at the same node
+        order = np.lexsort((
+            np.concatenate((np.arange(fragments), -np.asarray(depth, dtype=float))),
+            np.concatenate((np.zeros(fragments), np.ones(len(extraKeys)))),
+            np.concatenate((keys, extraKeys)),
+        ))
+        return order
+
+    def fragments(self, indices: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns (vertices, offsets) of the given fragments, back to back in the given order"""
+        gather, offsets = scene.ranges(
+            self.offsets[indices], self.offsets[indices + 1] - self.offsets[indices]
+        )
+        return self.vertices[gather], offsets
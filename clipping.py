@@ -0,0 +1,122 @@
+"""Vectorized culling and clipping of flat polygon batches in observer-relative coordinates"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+import scene
+
+def backfaces(vertices: np.ndarray, offsets: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Returns a mask of the candidate polygons that face away from an observer at the origin
+    Front faces wind counterclockwise when seen from the observer, lines and points never cull
+    """
+    counts = np.diff(offsets)
+    culled = np.zeros(len(counts), dtype=bool)
+    polygons = np.flatnonzero(candidates & (counts >= 3))
+    if not len(polygons):
+        return culled
+    gather, local = scene.ranges(offsets[polygons], counts[polygons])
+    points = vertices[gather]
+    # Area vector of each polygon, pointing out of its front
+    normals = np.add.reduceat(np.cross(points, points[scene.adjacent(local)]), local[:-1])
+    culled[polygons] = (normals * points[local[:-1]]).sum(axis=1) >= 0
+    return culled
+
+def _clip_lines(vertices: np.ndarray, distance: np.ndarray,
+                inside: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Clips (n, 2, 3) segments to a plane given each endpoint's (n, 2) distance from it
+    Returns the clipped segments that remain, and the mask of which remain
+    """
+    keep = inside.any(axis=1)
+    vertices, distance, inside = vertices[keep].copy(), distance[keep], inside[keep]
+    # Move the outside endpoint of crossing segments onto the plane
+    for end in (0, 1):
+        moved = ~inside[:, end]
+        t = distance[moved, end] / (distance[moved, end] - distance[moved, 1 - end])
+        start = vertices[moved, end]
+        vertices[moved, end] = start + (vertices[moved, 1 - end] - start) * t[:, None]
+    return vertices, keep
+
+def _clip_polygons(vertices: np.ndarray, offsets: np.ndarray,
+                   distance: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clips convex polygons to a plane given the distance of every vertex from it
+    Returns (vertices, offsets, kept) of the pieces with at least 3 points and their sources
+    """
+    inside = distance >= 0
+    following = scene.adjacent(offsets)
+    crossing = inside != inside[following]
+
+    # Each vertex emits itself if inside, then the crossing point of its edge if it has one
+    emitted = inside.astype(np.intp) + crossing
+    position = np.cumsum(emitted) - emitted
+    clipped = np.empty((int(emitted.sum()), 3))
+    clipped[position[inside]] = vertices[inside]
+    edges = np.flatnonzero(crossing)
+    t = distance[edges] / (distance[edges] - distance[following[edges]])
+    clipped[position[edges] + inside[edges]] = (
+        vertices[edges] + (vertices[following[edges]] - vertices[edges]) * t[:, None]
+    )
+
+    # Pieces reduced to a line or point by the plane are dropped
+    counts = np.add.reduceat(emitted, offsets[:-1]) if len(emitted) else np.zeros(0, np.intp)
+    kept = np.flatnonzero(counts >= 3)
+    starts = np.cumsum(counts) - counts
+    gather, pieces = scene.ranges(starts[kept], counts[kept])
+    return clipped[gather], pieces, kept
+
+def clip(vertices: np.ndarray, offsets: np.ndarray, normals: np.ndarray,
+         distances: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clips polygons, lines and points to the convex volume of normals . p + distances >= 0
+    Returns (vertices, offsets, sources) of what remains, in the original order,
+    where sources are the indices of the input polygons each output polygon came from
+    """
+    counts = np.diff(offsets)
+    if not len(counts):
+        return vertices, offsets, np.empty(0, dtype=np.intp)
+    inside = vertices @ np.asarray(normals, dtype=float).T + distances >= 0
+
+    # Polygons entirely inside pass through untouched, and ones entirely outside a plane are dropped
+    within = np.logical_and.reduceat(inside.all(axis=1), offsets[:-1])
+    if within.all():
+        return vertices, offsets, np.arange(len(counts))
+    outside = (~np.logical_or.reduceat(inside, offsets[:-1])).any(axis=1)
+    crossing = np.flatnonzero(~within & ~outside)
+
+    # Pieces of (sources, vertices, offsets), starting with the untouched polygons
+    sources = np.flatnonzero(within)
+    gather, local = scene.ranges(offsets[sources], counts[sources])
+    pieces = [(sources, vertices[gather], local)]
+
+    # Lines are clipped by moving endpoints, polygons by cutting them plane by plane
+    lines = crossing[counts[crossing] == 2]
+    if len(lines):
+        segments = vertices[offsets[lines, None] + np.arange(2)]
+        for normal, distance in zip(normals, distances):
+            side = segments @ normal + distance
+            segments, keep = _clip_lines(segments, side, side >= 0)
+            lines = lines[keep]
+        pieces.append((lines, segments.reshape(-1, 3), np.arange(len(lines) + 1) * 2))
+
+    polygons = crossing[counts[crossing] >= 3]
+    if len(polygons):
+        gather, local = scene.ranges(offsets[polygons], counts[polygons])
+        points = vertices[gather]
+        for normal, distance in zip(normals, distances):
+            if not len(polygons):
+                break
+            points, local, kept = _clip_polygons(points, local, points @ normal + distance)
+            polygons = polygons[kept]
+        pieces.append((polygons, points, local))
+
+    # Merge the pieces back into the original order
+    sources = np.concatenate([piece[0] for piece in pieces])
+    starts, sizes, base = [], [], 0
+    for _, points, local in pieces:
+        starts.append(local[:-1] + base)
+        sizes.append(np.diff(local))
+        base += len(points)
+    order = np.argsort(sources, kind="stable")
+    gather, merged = scene.ranges(np.concatenate(starts)[order], np.concatenate(sizes)[order])
+    return np.concatenate([piece[1] for piece in pieces])[gather], merged, sources[order]
@@ -2,6 +2,7 @@
 
 import math
 import logging
+import os
 
 # Config dictionary
 config = {
@@ -12,13 +13,60 @@ config = {
         "color": (0, 0, 0),
         # Window title
         "name": "Model",
+        # Fraction of the screen changed beyond which the whole display is flipped
+        "fullUpdate": 0.5,
     },
     "ui": {
         "panSpeed": 5,
         "rotateSpeed": math.pi/90,
     },
     "app": {
+        # Fixed rate of Model updates, which input and movement speeds are per
         "tps": 60,
+        # Cap on drawn frames per second, 0 for uncapped
+        # Drawn states are interpolated between updates
+        "fps": 60,
+        # Most updates run between two frames, beyond which the simulation slows instead
+        "maxSteps": 5,
+        # Synchronize frames with the display refresh, on platforms that support it
+        "vsync": False,
+    },
+    "scene": {
+        # OBJ, PLY or .scene cache file loaded into the Projection at startup, if any
+        "path": None,
+    },
+    "render": {
+        # Threads used by the zbuffer backend, each rasterizing square tiles of the window
+        "workers": 1,
+        "tile": 128,
+    },
+    "quality": {
+        # Lower the detail of the Projection when renders run over budget, and restore it after
+        "adaptive": True,
+        # Seconds per render aimed for, None for the frame time of app.fps (or app.tps if uncapped)
+        "budget": None,
+        # Fractions of the budget the mean render time must pass to lower or restore detail
+        "degrade": 0.9,
+        "restore": 0.5,
+        # Renders averaged before each change
+        "window": 10,
+        # Steps taken in order, each keeping the ones before:
+        # skip borders, draw edges only, drop small polygons, draw at a lower resolution
+        "ladder": ("borders", "wireframe", "decimate", "resolution"),
+        # Pixels a polygon must span on screen to be kept when decimating
+        "minSize": 4,
+        # Fraction of the window resolution drawn at the resolution step
+        "scale": 0.5,
+    },
+    "fonts": {
+        # File remembering where system fonts are, so they are found without scanning every run
+        "cache": os.path.join(os.path.expanduser("~"), ".cache", "model", "fonts.json"),
+    },
+    "profiling": {
+        # Time each stage of a frame, toggled at runtime with F3
+        "enabled": False,
+        # Number of recent frames kept for statistics
+        "history": 120,
     },
     "logging": {
         "level": logging.WARNING,
@@ -0,0 +1,248 @@
+"""Offline export of Projection flythroughs as numbered image files
+
+Moves the observer along a keyframed path, rendering every frame headlessly as fast as possible
+while a pool of workers encodes finished frames to disk, e.g.
+    python export.py --scene grid --size 1000 --duration 10 --fps 30 --output frames
+    python export.py --path flight.json --format rgb --output frames
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import threading
+import time
+import typing
+from dataclasses import dataclass
+
+# Render without a display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np #pylint: disable=wrong-import-position
+import pygame #pylint: disable=wrong-import-position
+from pygame import Vector3 #pylint: disable=wrong-import-position
+from pyquaternion import Quaternion #pylint: disable=wrong-import-position
+
+import bench #pylint: disable=wrong-import-position
+import projection #pylint: disable=wrong-import-position
+from config import config #pylint: disable=wrong-import-position
+
+# File formats frames are encoded to
+FORMATS = ("png", "rgb")
+
+@dataclass
+class Keyframe:
+    """Class containing where the observer is at a point in time of a path"""
+
+    time: float
+    origin: Vector3
+    quaternion: Quaternion
+
+class Path:
+    """Keyframed path of an observer, moving in straight lines and turning at constant speed
+    between keyframes, and holding still before the first and after the last
+    """
+
+    def __init__(self, keyframes: typing.Iterable[Keyframe]):
+
+        self.keyframes = sorted(keyframes, key=lambda keyframe: keyframe.time)
+        if not self.keyframes:
+            raise ValueError("Path needs at least one keyframe")
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first to the last keyframe"""
+        return self.keyframes[-1].time - self.keyframes[0].time
+
+    def sample(self, moment: float) -> typing.Tuple[Vector3, Quaternion]:
+        """Returns the (origin, quaternion) of the observer at a time"""
+        times = [keyframe.time for keyframe in self.keyframes]
+        index = int(np.searchsorted(times, moment, side="right"))
+        if index == 0:
+            return Vector3(self.keyframes[0].origin), Quaternion(self.keyframes[0].quaternion)
+        if index == len(self.keyframes):
+            return Vector3(self.keyframes[-1].origin), Quaternion(self.keyframes[-1].quaternion)
+        start, end = self.keyframes[index - 1], self.keyframes[index]
+        alpha = (moment - start.time) / (end.time - start.time)
+        return (
+            start.origin.lerp(end.origin, alpha),
+            Quaternion.slerp(start.quaternion, end.quaternion, alpha)
+        )
+
+    def place(self, observer: projection.Observer, moment: float) -> None:
+        """Moves an observer to where it is on the path at a time"""
+        observer.origin, observer.orientation.quaternion = self.sample(moment)
+
+    @staticmethod
+    def load(path: str) -> Path:
+        """Returns the Path of a JSON file holding a list of keyframes, each as
+        {"time": seconds, "origin": [x, y, z], "quaternion": [w, x, y, z]}
+        """
+        with open(path, encoding="utf-8") as file:
+            keyframes = json.load(file)
+        return Path(
+            Keyframe(frame["time"], Vector3(frame["origin"]), Quaternion(frame["quaternion"]))
+            for frame in keyframes
+        )
+
+    @staticmethod
+    def orbit(radius: float, duration: float, steps: int = 16) -> Path:
+        """Returns a Path circling the origin once, following the benchmark orbit"""
+        observer = bench.observer((1, 1))
+        keyframes = []
+        for step in range(steps + 1):
+            bench.orbit(observer, radius, step / steps)
+            keyframes.append(Keyframe(
+                duration * step / steps, Vector3(observer.origin),
+                Quaternion(observer.orientation.quaternion)
+            ))
+        return Path(keyframes)
+
+def encode(path: str, data: bytes, size: typing.Tuple[int, int], form: str) -> None:
+    """Writes the bytes of an RGB image to a file, as a png or as the raw bytes"""
+    if form == "png":
+        pygame.image.save(pygame.image.frombytes(data, size, "RGB"), path)
+    else:
+        with open(path, "wb") as file:
+            file.write(data)
+
+class Exporter:
+    """Encodes frames to numbered files in a directory on a pool of background workers\n
+        At most capacity frames are waiting or being encoded at once. Submitting beyond that
+        blocks until a worker finishes, so memory stays bounded and no frame is dropped
+        when rendering runs ahead of the disk
+    """
+
+    def __init__(self, directory: str, form: str = "png", workers: int = 2, capacity: int = 8,
+                 processes: bool = False):
+
+        if form not in FORMATS:
+            raise ValueError(f"Unknown format {form!r}, expected one of {FORMATS}")
+        if capacity < 1:
+            raise ValueError("Exporter capacity must be positive")
+        self.directory = directory
+        self.form = form
+        os.makedirs(directory, exist_ok=True)
+
+        # Threads share the GIL with rendering, processes avoid it at the cost of copying frames
+        if processes:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(capacity)
+
+        # Number of frames submitted, and the first encoding error, raised on close
+        self.count = 0
+        self._error: typing.Optional[BaseException] = None
+        # Seconds spent waiting for a free slot
+        self.waited = 0.0
+
+    def submit(self, surface: pygame.Surface) -> str:
+        """Queues a copy of a surface as the next frame, returning the path it is written to
+        Blocks while the exporter is full
+        """
+        if self._error is not None:
+            raise self._error
+        start = time.perf_counter()
+        self._slots.acquire()
+        self.waited += time.perf_counter() - start
+
+        # Copy the pixels now, since the surface is redrawn for the next frame
+        path = os.path.join(self.directory, f"frame{self.count:06d}.{self.form}")
+        self.count += 1
+        try:
+            future = self._pool.submit(
+                encode, path, pygame.image.tobytes(surface, "RGB"), surface.get_size(), self.form
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+        return path
+
+    def _done(self, future: concurrent.futures.Future) -> None:
+        """Frees the slot of a finished frame, remembering the first failure"""
+        if future.exception() is not None and self._error is None:
+            self._error = future.exception()
+        self._slots.release()
+
+    def close(self) -> None:
+        """Waits for every submitted frame to be written, raising the first encoding error"""
+        self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self) -> Exporter:
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+def render(model: projection.Projection, path: Path, fps: float,
+           exporter: Exporter) -> typing.List[float]:
+    """Renders the model from every frame of the path into the exporter,
+    returning the render time of each frame in seconds
+    """
+    frames = int(math.floor(path.duration * fps)) + 1
+    start = path.keyframes[0].time
+    times = []
+    for frame in range(frames):
+        path.place(model.observer, start + frame / fps)
+        begin = time.perf_counter()
+        surface = model.visual().surface
+        times.append(time.perf_counter() - begin)
+        exporter.submit(surface)
+    return times
+
+def main():
+    """Parses command line arguments and exports a flythrough"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scene", choices=sorted(bench.SCENES), default="grid")
+    parser.add_argument("--size", type=int, default=125, help="cubes for grid, triangles for soup")
+    parser.add_argument("--path", help="JSON keyframe file, by default one orbit of the scene")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds of the default orbit")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--window", type=int, nargs=2, default=config["screen"]["dimensions"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=projection.Projection.BACKENDS, default="painter")
+    parser.add_argument("--ordering", choices=projection.Projection.ORDERINGS, default="depth")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--workers", type=int, default=2, help="frames encoded at once")
+    parser.add_argument("--capacity", type=int, default=8,
+                        help="frames held in memory before rendering waits for encoding")
+    parser.add_argument("--processes", action="store_true",
+                        help="encode in worker processes instead of threads")
+    parser.add_argument("--output", default="frames", help="directory frames are written to")
+    arguments = parser.parse_args()
+
+    pygame.display.init()
+    window = tuple(arguments.window)
+    model = projection.Projection(
+        bench.observer(window), ordering=arguments.ordering, backend=arguments.backend,
+        workers=config["render"]["workers"], tile=config["render"]["tile"]
+    )
+    radius = bench.SCENES[arguments.scene](
+        model, arguments.size, np.random.default_rng(arguments.seed)
+    )
+    path = Path.load(arguments.path) if arguments.path else Path.orbit(radius, arguments.duration)
+
+    start = time.perf_counter()
+    with Exporter(arguments.output, arguments.format, arguments.workers, arguments.capacity,
+                  arguments.processes) as exporter:
+        times = render(model, path, arguments.fps, exporter)
+    total = time.perf_counter() - start
+    pygame.display.quit()
+
+    print(
+        f"Exported {exporter.count} frames of {window[0]}x{window[1]} to {arguments.output} "
+        f"in {total:.2f}s ({exporter.count / total:.1f} fps), "
+        f"rendering took {sum(times):.2f}s and waiting for encoding {exporter.waited:.2f}s"
+    )
+
+if __name__ == "__main__":
+    main()
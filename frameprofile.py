@@ -0,0 +1,90 @@
+"""Lightweight per-stage frame timing, with rolling statistics and an optional on-screen overlay"""
+
+from __future__ import annotations
+
+import collections
+import contextlib
+import time
+import typing
+
+import numpy as np
+import pygame
+
+import base
+
+# Context returned for every stage while disabled, so timing costs a single attribute check
+_DISABLED = contextlib.nullcontext()
+
+class Stage:
+    """Times a named stage as a context manager, keeping recent durations in a ring buffer"""
+
+    __slots__ = ("name", "samples", "start")
+
+    def __init__(self, name: str, history: int):
+        self.name = name
+        self.samples = collections.deque(maxlen=history)
+        self.start = 0.0
+
+    def __enter__(self) -> Stage:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.samples.append(time.perf_counter() - self.start)
+
+    def stats(self) -> typing.Dict[str, float]:
+        """Returns the last, mean, 95th percentile and max durations in milliseconds"""
+        samples = np.array(self.samples) * 1000
+        return {
+            "last": float(samples[-1]),
+            "mean": float(samples.mean()),
+            "p95": float(np.percentile(samples, 95)),
+            "max": float(samples.max()),
+            "count": len(samples),
+        }
+
+class Profiler:
+    """Collects timings of named frame stages while enabled\n
+        Usage is `with profiler.stage("name"):` around each stage of interest
+    """
+
+    def __init__(self, enabled: bool = False, history: int = 120):
+
+        self.enabled = enabled
+        # Number of recent samples kept per stage
+        self.history = history
+        # Stages in the order they were first timed
+        self.stages: typing.Dict[str, Stage] = {}
+
+    def stage(self, name: str) -> typing.ContextManager:
+        """Returns a context manager timing the named stage, which does nothing while disabled"""
+        if not self.enabled:
+            return _DISABLED
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = Stage(name, self.history)
+        return stage
+
+    def reset(self) -> None:
+        """Forgets every recorded timing"""
+        self.stages.clear()
+
+    def stats(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """Returns the rolling statistics of every stage that has samples, by name"""
+        return {name: stage.stats() for name, stage in self.stages.items() if stage.samples}
+
+    def overlay(self, surface: pygame.Surface, position: typing.Tuple[int, int] = (0, 0),
+                color: typing.Tuple[int, int, int] = (255, 255, 0)) -> None:
+        """Draws a table of mean and 95th percentile stage times onto a surface"""
+        panel = base.Panel(surface)
+        x, y = position
+        font = ("monospace", 12, color, (0, 0, 0))
+        for name, stats in self.stats().items():
+            # Stage names are drawn from cached labels, and only the numbers rendered anew
+            label = base.overlay.text(panel, f"{name:20} ", (x, y), *font)
+            times = f"{stats['mean']:7.2f} {stats['p95']:7.2f} ms"
+            base.overlay.readout(panel, times, (x + label.w, y), *font)
+            y += label.h
+
+# Shared profiler used by the Models, Managers and main loop
+profiler = Profiler()
@@ -0,0 +1,60 @@
+"""Adaptive level of detail, trading quality for frame time under load"""
+
+from __future__ import annotations
+
+import collections
+import typing
+
+Setting = typing.TypeVar("Setting")
+
+class Governor(typing.Generic[Setting]):
+    """Picks a quality level from a ladder of settings to keep render times within a budget\n
+        Level 0 is the first (best) setting. Render times are averaged over a window of frames;
+        above degrade * budget the level moves down the ladder, below restore * budget it moves
+        back up. The window is refilled after every change, so each change is measured
+        before the next one is made
+    """
+
+    def __init__(self, budget: float, ladder: typing.Sequence[Setting], degrade: float = 0.9,
+                 restore: float = 0.5, window: int = 10):
+
+        if not ladder:
+            raise ValueError("Ladder needs at least one setting")
+        if restore >= degrade:
+            raise ValueError("Restore threshold must be below the degrade threshold")
+
+        # Target seconds per render, and the settings from best to cheapest
+        self.budget = budget
+        self.ladder = list(ladder)
+        self.degrade = degrade
+        self.restore = restore
+
+        # Recent render times, and the current index into the ladder
+        self.samples: typing.Deque[float] = collections.deque(maxlen=window)
+        self.level = 0
+
+    @property
+    def setting(self) -> Setting:
+        """Setting of the current level"""
+        return self.ladder[self.level]
+
+    def record(self, seconds: float) -> bool:
+        """Adds the time of a render, returning whether the level changed"""
+        self.samples.append(seconds)
+        if len(self.samples) < self.samples.maxlen:
+            return False
+
+        mean = sum(self.samples) / len(self.samples)
+        if mean > self.degrade * self.budget and self.level < len(self.ladder) - 1:
+            self.level += 1
+        elif mean < self.restore * self.budget and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        self.samples.clear()
+        return True
+
+    def reset(self) -> None:
+        """Returns to the best level, forgetting recent times"""
+        self.samples.clear()
+        self.level = 0
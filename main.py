@@ -3,8 +3,11 @@
 import logging
 import pygame
 
-import projection
+import base
 from config import config
+from governor import Governor
+from frameprofile import profiler
+from scheduler import Scheduler
 
 # Set global logging level
 logging.getLogger().setLevel(config["logging"]["level"])
@@ -16,29 +19,46 @@ logger.addHandler(logging.StreamHandler())
 def main():
     """Main function to start the script"""
 
-    # Initialize pygame
-    pygame.init()
+    # Initialize only the display, the Manager initializes anything else it needs
+    pygame.display.init()
+    # Remember where fonts are between runs, so loading them does not scan the system fonts
+    base.overlay.pathCache = config["fonts"]["cache"]
+
+    # Configure frame stage profiling
+    profiler.enabled = config["profiling"]["enabled"]
+    profiler.history = config["profiling"]["history"]
 
     # Reference output screen
-    screen = pygame.display.set_mode(config["screen"]["dimensions"])
+    if config["app"]["vsync"]:
+        # Vsync is only available for scaled or OpenGL displays
+        screen = pygame.display.set_mode(config["screen"]["dimensions"], pygame.SCALED, vsync=1)
+    else:
+        screen = pygame.display.set_mode(config["screen"]["dimensions"])
     pygame.display.set_caption(config["screen"]["name"])
 
-    # Create clock
+    # Create clock, limiting drawn frames, and scheduler, running updates at a fixed rate
     clock = pygame.time.Clock()
+    scheduler = Scheduler(config["app"]["tps"], config["app"]["maxSteps"])
 
     # Set the background color
     screen.fill(config["screen"]["color"])
+    # Area of the screen, beyond a fraction of which changes are shown with a full flip
+    fullArea = config["screen"]["fullUpdate"] * screen.get_width() * screen.get_height()
 
     # Create model and manager
     # This portion of code is modified to implement different managers
     # The event loop expects a base.Manager named `manager`
 
+    # Import the model here, so the dependencies of other models are never loaded
+    import projection #pylint: disable=import-outside-toplevel
+    #import stargon
+
     # Create and populate model
     model = projection.Projection(projection.Observer(
         origin=pygame.Vector3(0, 0, -config["screen"]["focal"]*2),
         orientation=projection.Rotation(pygame.Vector3(0, 0, 0), 0),
         focal=config["screen"]["focal"], window=config["screen"]["dimensions"]
-    ))
+    ), workers=config["render"]["workers"], tile=config["render"]["tile"])
 
     # Variable for radius of cube
     cube = 100
@@ -75,22 +95,49 @@ def main():
         pygame.Vector3(-cube, 3*cube, -cube),
     )
 
+    # Load a mesh file, if configured
+    if config["scene"]["path"]:
+        model.load(config["scene"]["path"])
+
+    # Create a governor lowering detail when renders cannot keep up
+    quality = config["quality"]
+    governor = None
+    if quality["adaptive"]:
+        budget = quality["budget"] or 1 / (config["app"]["fps"] or config["app"]["tps"])
+        ladder = projection.Detail.ladder(quality["ladder"], quality["minSize"], quality["scale"])
+        governor = Governor(
+            budget, ladder, quality["degrade"], quality["restore"], quality["window"]
+        )
+
     # Create Manager
     manager = projection.ProjectionManager(
-        model, screen, projection.Controller(config["ui"]["panSpeed"], config["ui"]["rotateSpeed"])
+        model, screen, projection.Controller(config["ui"]["panSpeed"], config["ui"]["rotateSpeed"]),
+        governor
     )
 
     # Create a Stargon Manager
     #manager = stargon.StargonManager(stargon.Stargon(200, 9), screen)
 
+    # Managers erase what they no longer draw with the background color
+    manager.background = pygame.Color(config["screen"]["color"])
+
+    # Initialize what the manager needs and load its fonts before the first frame
+    manager.prepare()
+
     # Event loop
     # Shouldnt need to be changed to implement different models
     running = True
+    # Events not yet seen by a step, since frames can pass without any
+    pending = []
+    # Whether the whole screen must be cleared and redrawn, as on the first frame
+    full = True
     while running:
 
         # Retrieve pygame event queue to allow multiple viewings
         # (since pygame.event.get() will clear the queue whenever used)
-        events = pygame.event.get()
+        with profiler.stage("loop.events"):
+            events = pygame.event.get()
+            pending.extend(events)
 
         # Show information around events
         if events:
@@ -104,20 +151,56 @@ def main():
             if event.type == pygame.QUIT:
                 running = False
 
-        # Only continue if program hasnt been terminated
-        if running:
-
-            # Clear the background
-            screen.fill(config["screen"]["color"])
+            # Toggle profiling, starting fresh each time
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.enabled = not profiler.enabled
+                profiler.reset()
+                full = True
 
-            # Update manager to allow for interactive input
-            manager.update(events, pygame.key.get_pressed())
+            # Window contents may have been lost
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.VIDEORESIZE):
+                full = True
 
-            # Flip pygame display to actually show changes
-            pygame.display.flip()
+        # Only continue if program hasnt been terminated
+        if running:
 
-            # Limit the speed of ticks
-            clock.tick(config["app"]["tps"])
+            # Run however many fixed updates have come due, events going to the first
+            with profiler.stage("loop.step"):
+                keyboard = pygame.key.get_pressed()
+                for _ in range(scheduler.advance()):
+                    manager.step(pending, keyboard)
+                    pending = []
+                manager.model.interpolate(scheduler.alpha)
+
+            # The profiler overlay is drawn over everything, so needs a full redraw to stay clean
+            full = full or profiler.enabled
+
+            # Clear the background, unless the manager only redraws what changed
+            if full:
+                with profiler.stage("loop.clear"):
+                    screen.fill(config["screen"]["color"])
+                    manager.invalidate()
+
+            # Update manager to draw the model, getting back the changed areas
+            with profiler.stage("loop.update"):
+                rects = manager.update(events, keyboard)
+
+            # Show stage timings over everything else
+            if profiler.enabled:
+                profiler.overlay(screen, (0, 30))
+
+            # Show only the changed areas, or flip the whole display when most of it changed
+            with profiler.stage("loop.flip"):
+                if full or rects is None or sum(rect.w * rect.h for rect in rects) > fullArea:
+                    pygame.display.flip()
+                elif rects:
+                    pygame.display.update(rects)
+            # Managers not reporting changes redraw everything, so need clearing every frame
+            full = rects is None
+
+            # Limit the speed of frames
+            with profiler.stage("loop.tick"):
+                clock.tick(config["app"]["fps"])
 
             logger.info("FPS: %s", clock.get_fps())
 
@@ -0,0 +1,343 @@
+"""Streaming readers of mesh files, and a binary scene cache that opens with mmap"""
+
+from __future__ import annotations
+
+import itertools
+import os
+import struct
+import typing
+
+import numpy as np
+
+import scene
+
+# Default colors of polygons read from files without any, matching base.Panel
+FILL_COLOR = (127, 127, 127)
+LINE_COLOR = (255, 255, 255)
+
+# Number of lines (OBJ) or records (PLY) parsed at a time
+CHUNK = 1 << 16
+
+# Scene cache header: magic, format version, vertex count and polygon count, padded to 64 bytes
+CACHE_MAGIC = b"MODELSCN"
+CACHE_VERSION = 2
+_CACHE_HEADER = struct.Struct("<8sIQQ")
+_CACHE_SIZE = 64
+
+# Binary PLY property types
+_PLY_TYPES = {
+    "char": "i1", "uchar": "u1", "short": "i2", "ushort": "u2",
+    "int": "i4", "uint": "u4", "float": "f4", "double": "f8",
+    "int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2",
+    "int32": "i4", "uint32": "u4", "float32": "f4", "float64": "f8",
+}
+
+def _colored(vertices: np.ndarray, indices: np.ndarray, colors: np.ndarray = None,
+             fill: scene.Color = FILL_COLOR, line: scene.Color = LINE_COLOR) -> scene.Mesh:
+    """Returns a Mesh of polygons given by an (n, k) array of vertex indices
+    Polygons without colors get the fill color, or the line color if they have fewer than 3 points
+    """
+    number, arity = indices.shape
+    if colors is None:
+        colors = fill if arity > 2 else line
+    return scene.Mesh(
+        vertices[indices.ravel()], np.arange(number + 1) * arity,
+        np.broadcast_to(np.asarray(colors, dtype=np.uint8), (number, 3))
+    )
+
+def read_obj(path: str, chunk: int = CHUNK, fill: scene.Color = FILL_COLOR,
+             line: scene.Color = LINE_COLOR) -> typing.Iterator[scene.Mesh]:
+    """Yields the faces and lines of a Wavefront OBJ file as Meshes, parsing <chunk> lines at a time
+    Only vertex positions are used, and polylines are split into separate segments
+    """
+    vertices = np.empty((0, 3))
+    count = 0
+    with open(path, encoding="utf-8") as file:
+        while True:
+            lines = list(itertools.islice(file, chunk))
+            if not lines:
+                break
+
+            # Split the chunk into vertices and elements, noting the vertex count at each element
+            points, elements, before = [], [], []
+            for text in lines:
+                if text.startswith("v "):
+                    points.append(text.split()[1:4])
+                elif text.startswith(("f ", "l ")):
+                    tokens = text.split()
+                    if tokens[0] == "l":
+                        # Polylines become segments between consecutive points
+                        for pair in zip(tokens[1:], tokens[2:]):
+                            elements.append(pair)
+                            before.append(count + len(points))
+                    else:
+                        elements.append(tokens[1:])
+                        before.append(count + len(points))
+
+            if points:
+                grow = scene._grow #pylint: disable=protected-access
+                vertices = grow(vertices, count + len(points))
+                vertices[count:count + len(points)] = np.array(points, dtype=float)
+                count += len(points)
+            if not elements:
+                continue
+
+            # Parse each arity separately so indices form rectangular arrays
+            arities = np.array([len(element) for element in elements])
+            before = np.array(before)
+            meshes = []
+            for arity in np.unique(arities).tolist():
+                selected = np.flatnonzero(arities == arity)
+                tokens = np.array([elements[index] for index in selected.tolist()])
+                # Drop texture and normal indices from v/vt/vn references
+                tokens = np.char.partition(tokens, "/")[..., 0]
+                indices = tokens.astype(np.int64)
+                # Indices are 1-based, and negative ones count back from the latest vertex
+                indices = np.where(indices < 0, indices + before[selected, None], indices - 1)
+                if ((indices < 0) | (indices >= count)).any():
+                    raise ValueError(f"{path}: element refers to a missing vertex")
+                meshes.append(_colored(vertices, indices, fill=fill, line=line))
+            yield scene.Mesh.join(meshes)
+
+def _ply_header(file: typing.BinaryIO) -> typing.Tuple[str, typing.List]:
+    """Reads a PLY header, returning the byte order prefix and a list of (name, count, properties)
+    Properties are (name, type) for scalars and (name, (count type, item type)) for lists
+    """
+    if file.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    order, elements = None, []
+    while True:
+        line = file.readline()
+        if not line:
+            raise ValueError("PLY header is not terminated")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            if words[1] == "binary_little_endian":
+                order = "<"
+            elif words[1] == "binary_big_endian":
+                order = ">"
+            else:
+                raise ValueError(f"Only binary PLY files are supported, not {words[1]}")
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], (_PLY_TYPES[words[2]], _PLY_TYPES[words[3]])))
+            else:
+                elements[-1][2].append((words[2], _PLY_TYPES[words[1]]))
+    if order is None:
+        raise ValueError("PLY header has no format")
+    return order, elements
+
+def _ply_dtype(order: str, properties: typing.List, arity: int = 0) -> np.dtype:
+    """Returns the record dtype of an element, with any list property holding <arity> items"""
+    fields = []
+    for name, kind in properties:
+        if isinstance(kind, tuple):
+            fields.append(("count", order + kind[0]))
+            fields.append((name, order + kind[1], (arity,)))
+        else:
+            fields.append((name, order + kind))
+    return np.dtype(fields)
+
+def _rgb(records: np.ndarray) -> typing.Optional[np.ndarray]:
+    """Returns the (n, 3) red, green and blue properties of records, if present"""
+    if all(channel in records.dtype.names for channel in ("red", "green", "blue")):
+        return np.stack([records[channel] for channel in ("red", "green", "blue")], axis=1)
+    return None
+
+def _ply_faces(data: bytes, number: int, order: str, properties: typing.List,
+               counter: np.dtype, item: int) -> typing.Tuple[np.ndarray, np.ndarray, int]:
+    """Returns the byte offsets and list lengths of up to <number> whole face records in data,
+    and the offset just past the last of them.
+    Each record is the size of a face without list items, plus <item> bytes per list item
+    """
+    base = _ply_dtype(order, properties)
+    prefix, width = base.fields["count"][1], counter.itemsize
+    raw = np.frombuffer(data, np.uint8)
+    starts, counts = np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    position = 0
+    if len(data) >= prefix + width:
+        # Most files have faces of one arity, so first check every face has that of the first
+        arity = int(np.frombuffer(data, counter, 1, prefix)[0])
+        size = base.itemsize + arity * item
+        starts = np.arange(min(number, len(data) // size)) * size
+        counts = raw[starts[:, None] + prefix + np.arange(width)].view(counter).ravel()
+        same = counts == arity
+        if not same.all():
+            starts, counts = starts[:int(np.argmin(same))], counts[:int(np.argmin(same))]
+        counts = counts.astype(np.intp)
+        position = len(starts) * size
+    if len(starts) == number:
+        return starts, counts, position
+
+    # Otherwise walk the rest one face at a time, as each offset depends on the counts before it
+    code = {1: "b", 2: "h", 4: "i"}[width]
+    unpack = struct.Struct(order + (code.upper() if counter.kind == "u" else code)).unpack_from
+    walked, lengths = [], []
+    while len(starts) + len(walked) < number and position + prefix + width <= len(data):
+        arity = unpack(data, position + prefix)[0]
+        size = base.itemsize + arity * item
+        if position + size > len(data):
+            break
+        walked.append(position)
+        lengths.append(arity)
+        position += size
+    return (
+        np.concatenate((starts, np.array(walked, dtype=np.intp))),
+        np.concatenate((counts, np.array(lengths, dtype=np.intp))), position
+    )
+
+def read_ply(path: str, chunk: int = CHUNK, fill: scene.Color = FILL_COLOR,
+             line: scene.Color = LINE_COLOR) -> typing.Iterator[scene.Mesh]:
+    """Yields the faces of a binary PLY file as Meshes, <chunk> faces at a time
+    Faces take their own colors if present, otherwise the mean color of their vertices
+    """
+    with open(path, "rb") as file:
+        order, elements = _ply_header(file)
+        vertices, vertexColors = None, None
+
+        for name, number, properties in elements:
+            lists = [kind for _, kind in properties if isinstance(kind, tuple)]
+
+            if name == "vertex":
+                if lists:
+                    raise ValueError(f"{path}: vertex list properties are not supported")
+                dtype = _ply_dtype(order, properties)
+                vertices = np.empty((number, 3))
+                for start in range(0, number, chunk):
+                    size = min(chunk, number - start)
+                    records = np.frombuffer(file.read(dtype.itemsize * size), dtype)
+                    if len(records) < size:
+                        raise ValueError(f"{path}: file ends within the vertex element")
+                    vertices[start:start + size] = np.stack([records[axis] for axis in "xyz"], 1)
+                    colors = _rgb(records)
+                    if colors is not None:
+                        if vertexColors is None:
+                            vertexColors = np.empty((number, 3), dtype=np.uint8)
+                        vertexColors[start:start + size] = colors
+                continue
+
+            if name != "face" or len(lists) != 1:
+                # Skip other elements, which needs a fixed record size
+                if lists:
+                    raise ValueError(f"{path}: cannot skip element {name} with list properties")
+                file.seek(_ply_dtype(order, properties).itemsize * number, os.SEEK_CUR)
+                continue
+
+            if vertices is None:
+                raise ValueError(f"{path}: faces come before vertices")
+            key = next(name for name, kind in properties if isinstance(kind, tuple))
+            counter = np.dtype(order + lists[0][0])
+
+            # Read blocks of variable size records, each sized for <chunk> quads
+            item = np.dtype(order + lists[0][1]).itemsize
+            block = chunk * _ply_dtype(order, properties, 4).itemsize
+            pending, remaining = b"", number
+            while remaining:
+                # Top the buffer up to a block, after the partial face left from the last one
+                data = file.read(max(block - len(pending), 0))
+                buffer = pending + data
+                starts, counts, end = _ply_faces(
+                    buffer, min(chunk, remaining), order, properties, counter, item
+                )
+                if not len(starts):
+                    if not data and len(pending) < block:
+                        raise ValueError(f"{path}: file ends within the face element")
+                    # A single face is larger than a block
+                    pending, block = buffer, 2 * block
+                    continue
+                pending = buffer[end:]
+                remaining -= len(starts)
+
+                # Split the faces by arity so each forms fixed size records
+                raw = np.frombuffer(buffer, np.uint8)
+                meshes = []
+                for arity in np.unique(counts).tolist():
+                    if not arity:
+                        continue
+                    dtype = _ply_dtype(order, properties, arity)
+                    selected = starts[counts == arity]
+                    records = raw[selected[:, None] + np.arange(dtype.itemsize)].view(dtype).ravel()
+                    indices = records[key].astype(np.intp)
+                    if ((indices < 0) | (indices >= len(vertices))).any():
+                        raise ValueError(f"{path}: face refers to a missing vertex")
+                    colors = _rgb(records)
+                    if colors is None and vertexColors is not None:
+                        colors = vertexColors[indices].mean(axis=1).round()
+                    meshes.append(_colored(vertices, indices, colors, fill, line))
+                if meshes:
+                    yield scene.Mesh.join(meshes)
+            # Leave the file at the end of the face element
+            file.seek(-len(pending), os.SEEK_CUR)
+
+def read(path: str, chunk: int = CHUNK, fill: scene.Color = FILL_COLOR,
+         line: scene.Color = LINE_COLOR) -> typing.Iterator[scene.Mesh]:
+    """Yields the polygons of an OBJ, PLY or scene cache file as Meshes, chosen by extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".obj":
+        yield from read_obj(path, chunk, fill, line)
+    elif extension == ".ply":
+        yield from read_ply(path, chunk, fill, line)
+    elif extension == ".scene":
+        yield open_cache(path)
+    else:
+        raise ValueError(f"Unknown mesh file extension {extension!r}")
+
+def _cache_layout(vertices: int, polygons: int) -> typing.List[typing.Tuple[str, tuple]]:
+    """Returns the (dtype, shape) of each array of a scene cache, in file order"""
+    return [
+        ("<f8", (vertices, 3)), ("<i8", (polygons + 1,)),
+        ("<f8", (polygons, 3)), ("<f8", (polygons, 3)),
+        ("u1", (polygons, 3)), ("u1", (polygons,)), ("u1", (polygons,)),
+    ]
+
+def write_cache(path: str, mesh: scene.Mesh) -> None:
+    """Writes a Mesh to a scene cache file, which open_cache maps back without parsing
+    The header is followed by float64 vertices, int64 offsets, float64 minimum and maximum
+    corners of each polygon, then uint8 colors, kinds and cull flags, so loading needs
+    neither classification nor bounds
+    """
+    mesh = mesh.classified()
+    lo, hi = mesh.boxes()
+    cull = np.zeros(len(mesh), dtype=bool) if mesh.cull is None else mesh.cull
+    arrays = (
+        mesh.vertices[mesh.offsets[0]:mesh.offsets[-1]], mesh.offsets - mesh.offsets[0],
+        lo, hi, mesh.colors, mesh.kinds, cull
+    )
+    with open(path, "wb") as file:
+        header = _CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, int(mesh.offsets[-1] - mesh.offsets[0]), len(mesh)
+        )
+        file.write(header.ljust(_CACHE_SIZE, b"\0"))
+        for array, (dtype, _) in zip(arrays, _cache_layout(0, 0)):
+            file.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+def open_cache(path: str) -> scene.Mesh:
+    """Returns the Mesh in a scene cache file, with arrays memory mapped rather than read
+    Pages are only loaded as they are used, and the arrays are read only
+    """
+    with open(path, "rb") as file:
+        magic, version, vertices, polygons = _CACHE_HEADER.unpack(
+            file.read(_CACHE_HEADER.size)
+        )
+    if magic != CACHE_MAGIC:
+        raise ValueError(f"{path}: not a scene cache")
+    if version != CACHE_VERSION:
+        raise ValueError(f"{path}: scene cache version {version}, expected {CACHE_VERSION}")
+
+    # Map each array at its offset in the file
+    offset = _CACHE_SIZE
+    arrays = []
+    for dtype, shape in _cache_layout(vertices, polygons):
+        if np.prod(shape):
+            arrays.append(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape))
+        else:
+            arrays.append(np.empty(shape, dtype=dtype))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    vertices, offsets, lo, hi, colors, kinds, cull = arrays
+    return scene.Mesh(vertices, offsets, colors, kinds, cull.view(bool), (lo, hi))
@@ -2,14 +2,71 @@
 
 from __future__ import annotations
 
+import time
+import typing
+import dataclasses
 from dataclasses import dataclass
 
+import numpy as np
+
 import pygame
 from pygame import Vector3
 
 from pyquaternion import Quaternion
 
 import base
+import bsp
+import clipping
+from governor import Governor
+import meshio
+from frameprofile import profiler
+import raster
+import scene
+import scenegraph
+import spatial
+
+# Default colors of lines and filled polygons, matching base.Panel
+LINE_COLOR = (255, 255, 255)
+FILL_COLOR = (127, 127, 127)
+
+def _wire_cube() -> scene.Mesh:
+    """Returns the 12 edges of a cube with points 1 away from the origin, as lines"""
+    # Draws 3 sets of 4 lines, where each set is a different dimension
+    # Each set has the negative of that dimension to the positive
+    # And the 4 lines are iteration of -1, -1 -> 1, 1 (sorta binary)
+    lines = []
+    # Iterate through the 3 dimensions
+    for dimension in range(3):
+        # Iterate through -1/-1, -1/1, 1/-1, 1/1 for non base dimensions
+        for first in (-1, 1):
+            for second in (-1, 1):
+                # Start on negative of the main dimension, filling the other two dimensions
+                start = np.zeros(3)
+                start[dimension] = -1
+                start[(dimension + 1)%3] = first
+                start[(dimension + 2)%3] = second
+                # Duplicate start to end but change the main dimension
+                end = start.copy()
+                end[dimension] = 1
+                lines.append((start, end))
+    return scene.Mesh.from_polygons(lines, LINE_COLOR)
+
+def _solid_cube() -> scene.Mesh:
+    """Returns the 6 faces of a cube with points 1 away from the origin, wound to face outwards"""
+    faces = []
+    for dimension in range(3):
+        for side in (-1, 1):
+            # Corners around the face, counterclockwise seen from outside the cube
+            corners = [(-1, -1), (1, -1), (1, 1), (-1, 1)][::side]
+            face = np.zeros((4, 3))
+            face[:, dimension] = side
+            face[:, (dimension + 1)%3], face[:, (dimension + 2)%3] = np.transpose(corners)
+            faces.append(face)
+    return scene.Mesh.from_polygons(faces, FILL_COLOR)
+
+# Shared meshes of unit cubes, placed with Projection.add_instance
+WIRE_CUBE = _wire_cube()
+SOLID_CUBE = _solid_cube().closed()
 
 class Rotation:
     """Represents a 3D rotation based on axis and angle
@@ -32,6 +89,12 @@ class Rotation:
         """Returns a rotated version of the given vector based on this Rotation"""
         return Vector3(*self.quaternion.rotate(vector))
 
+    def matrix(self) -> np.ndarray:
+        """Returns the 3x3 rotation matrix equivalent to this Rotation
+        Applied to row vectors as `points @ matrix.T`
+        """
+        return self.quaternion.rotation_matrix
+
     def __neg__(self) -> Rotation:
         """Returns the negative of this Rotation, around same axis but different direction"""
         return Rotation(self.quaternion.axis, -self.quaternion.angle)
@@ -46,6 +109,71 @@ class Observer:
     focal: float
     window: base.Point
 
+    # Distance in front of the observer closer than which nothing is drawn
+    near: float = 1.0
+
+    def fingerprint(self) -> typing.Tuple:
+        """Returns a hashable summary of the observer state, which changes whenever it moves"""
+        return (
+            tuple(self.origin), tuple(self.orientation.quaternion.elements),
+            self.focal, tuple(self.window), self.near
+        )
+
+    def planes(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (normals, offsets) of the relative-space planes bounding the visible volume
+        A relative point p is visible only if normals @ p + offsets >= 0 for every plane
+        """
+        # Half window, with a pixel of margin so border pixels are never culled
+        width, height = self.window[0] / 2 + 1, self.window[1] / 2 + 1
+        # Near plane, then planes through the observer: left, right, bottom, top
+        normals = np.array((
+            (0, 0, 1),
+            (self.focal, 0, width), (-self.focal, 0, width),
+            (0, self.focal, height), (0, -self.focal, height),
+        ), dtype=float)
+        return normals, np.array((-self.near, 0, 0, 0, 0), dtype=float)
+
+    def frustum(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (normals, offsets) of the world-space planes bounding the visible volume
+        A point p may be visible only if normals @ p + offsets >= 0 for every plane
+        """
+        normals, offsets = self.planes()
+        # Rotate the planes back into world coordinates
+        normals = normals @ self.orientation.matrix()
+        return normals, offsets - normals @ np.asarray(self.origin, dtype=float)
+
+@dataclass(frozen=True)
+class Detail:
+    """Class containing how much detail a Projection is drawn with, lowered under load"""
+
+    # Whether filled polygons are outlined
+    borders: bool = True
+    # Whether polygons are drawn as their edges only, colored like the polygon
+    wireframe: bool = False
+    # Polygons spanning fewer window pixels than this are dropped, mostly distant ones
+    minSize: float = 0
+    # Fraction of the window resolution drawn, then scaled up to the window
+    scale: float = 1.0
+
+    @staticmethod
+    def ladder(steps: typing.Sequence[str], minSize: float = 4,
+               scale: float = 0.5) -> typing.List[Detail]:
+        """Returns full Detail followed by one Detail per step, each keeping the steps before it
+        Steps are "borders", "wireframe", "decimate" and "resolution"
+        """
+        changes = {
+            "borders": {"borders": False},
+            "wireframe": {"wireframe": True},
+            "decimate": {"minSize": minSize},
+            "resolution": {"scale": scale},
+        }
+        details = [Detail()]
+        for step in steps:
+            if step not in changes:
+                raise ValueError(f"Unknown detail step {step!r}, expected one of {tuple(changes)}")
+            details.append(dataclasses.replace(details[-1], **changes[step]))
+        return details
+
 @dataclass
 class Controller:
     """Class containing data about the controls of the Projection"""
@@ -55,129 +183,559 @@ class Controller:
 class Projection(base.Model):
     """Represents a 3 dimensional space projected into 2D based on an observer"""
 
-    def __init__(self, observer: Observer):
+    # Ways of ordering polygons back to front
+    ORDERINGS = ("depth", "bsp")
+    # Ways of drawing polygons
+    BACKENDS = ("painter", "zbuffer")
 
-        # Reference observer
-        self.observer = observer
+    def __init__(self, observer: typing.Union[Observer, typing.Sequence[Observer]],
+                 culling: bool = True, ordering: str = "depth", backend: str = "painter",
+                 workers: int = 1, tile: int = 128):
+        # Delegate super init
+        super().__init__()
 
-        # Initialize list of polygons
-        self.polygons = []
+        # Reference observers, the first of which is drawn by visual and moved by controls
+        self.observers: typing.List[Observer] = (
+            [observer] if isinstance(observer, Observer) else list(observer)
+        )
+        if not self.observers:
+            raise ValueError("Projection needs at least one observer")
+
+        # Draw ordered polygons through the Panel, or rasterize them with a depth buffer
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {self.BACKENDS}")
+        self.backend = backend
+        # Worker threads, each rasterizing square tiles, only apply to the zbuffer backend
+        self.rasterizer = raster.Rasterizer(workers=workers, tile=tile)
+
+        # Depth sort every frame, or traverse a BSP tree built when the scene changes
+        if ordering not in self.ORDERINGS:
+            raise ValueError(f"Unknown ordering {ordering!r}, expected one of {self.ORDERINGS}")
+        self.ordering = ordering
+        self._tree = None
+        self._treeVersion = None
+
+        # Initialize compact polygon storage
+        self.polygons = scene.PolygonStore()
+
+        # Spatial index of polygon bounds, used to skip polygons outside the view
+        self.index = spatial.Octree() if culling else None
+
+        # Hierarchy of meshes placed by local transforms, for objects that move
+        self.graph = scenegraph.SceneGraph()
+
+        # Copies of shared meshes, by mesh
+        self.instances: typing.Dict[scene.Mesh, scene.Instances] = {}
+
+        # Level of detail drawn, and the buffer of lower resolution drawings
+        self.detail = Detail()
+        self._lowres = base.PanelBuffer()
+        # Buffers of the panel and lower resolution drawing of each view drawn by visuals
+        self._views: typing.List[typing.Tuple[base.PanelBuffer, base.PanelBuffer]] = []
+
+        # Observer (origin, quaternion) before and after the latest update, for interpolation
+        # The latest is only kept while the observer holds an interpolated state
+        self._previous: typing.Optional[typing.Tuple[Vector3, Quaternion]] = None
+        self._latest: typing.Optional[typing.Tuple[Vector3, Quaternion]] = None
+
+    @property
+    def observer(self) -> Observer:
+        """Main observer, drawn by visual"""
+        return self.observers[0]
+
+    @observer.setter
+    def observer(self, observer: Observer) -> None:
+        self.observers[0] = observer
+
+    def frusta(self, observers: typing.Sequence[Observer] = None
+               ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the stacked (v, k, 3) normals and (v, k) offsets of the visible volumes
+        of the given observers, by default just the main observer
+        """
+        frusta = [observer.frustum() for observer in observers or (self.observer,)]
+        return (
+            np.stack([normals for normals, _ in frusta]),
+            np.stack([offsets for _, offsets in frusta])
+        )
 
-    def add_polygon(self, *points: Vector3) -> None:
-        """Adds a filled 3D polygon to the Model
+    def add_polygon(self, *points: Vector3, color: scene.Color = None) -> int:
+        """Adds a filled 3D polygon to the Model, returning a handle to it
         Care should be used creating bent high-order polygons, depth may not be properly shown
         Also can be used for lines
         """
-        self.polygons.append(points)
-
-    def add_wire_cube(self, center: Vector3, radius: float):
-        """Draws a wire-frame cube with points <radius> away from <center>"""
-        # Draws 3 sets of 4 lines, where each set is a different dimension
-        # Each set has the negative of that dimension to the positive
-        # And the 4 lines are iteration of -1, -1 -> 1, 1 (sorta binary)
-        # Iterate through the 3 dimensions
-        for dimension in range(3):
-            # Iterate through -1/-1, -1/1, 1/-1, 1/1 for non base dimensions
-            for first in (-radius, radius):
-                for second in (-radius, radius):
-                    # Init base vector
-                    start = pygame.Vector3(0, 0, 0)
-                    # Start on negative of the main dimension
-                    start[dimension] = -radius
-                    # Fill the other two dimensions
-                    start[(dimension + 1)%3] = first
-                    start[(dimension + 2)%3] = second
-                    # Duplicate start to end but change the main dimension
-                    end = pygame.Vector3(start)
-                    end[dimension] = radius
-                    # Add the line
-                    self.add_polygon(
-                        center + start,
-                        center + end
-                    )
+        return int(self.add_polygons(np.array([points], dtype=float).reshape(1, -1, 3), color)[0])
+
+    def add_polygons(self, points: np.ndarray, colors: np.ndarray = None) -> np.ndarray:
+        """Adds an (n, k, 3) array of n polygons with k points each, returning their handles
+        Colors can be a single color or an (n, 3) array
+        """
+        mesh = scene.Mesh.from_polygons(points, FILL_COLOR if colors is None else colors)
+        mesh = mesh.classified()
+        if colors is None:
+            # Default by kind, so polygons collapsed to lines or points are drawn as such
+            mesh.colors[mesh.kinds <= scene.LINE] = LINE_COLOR
+        return self.add_mesh(mesh)
+
+    def add_mesh(self, mesh: scene.Mesh) -> np.ndarray:
+        """Adds every polygon of a Mesh in world coordinates, returning their handles"""
+        mesh = mesh.classified()
+        handles = self.polygons.add_mesh(mesh)
+        if self.index is not None and len(handles):
+            self.index.insert(handles, *mesh.boxes())
+        return handles
+
+    def load(self, path: str, chunk: int = meshio.CHUNK) -> np.ndarray:
+        """Adds the polygons of an OBJ, PLY or scene cache file, returning their handles
+        Files are streamed into the polygon store <chunk> elements at a time
+        """
+        handles = [self.add_mesh(mesh) for mesh in meshio.read(path, chunk, FILL_COLOR, LINE_COLOR)]
+        return np.concatenate(handles) if handles else np.empty(0, dtype=np.intp)
 
-    def add_cube(self, center: Vector3, radius: float):
-        """Draws a solid-face cube with points <radius> away from <center>"""
-        raise NotImplementedError("Not implemented yet")
+    def save(self, path: str) -> None:
+        """Writes every polygon to a scene cache file, which load opens without parsing
+        Scene graph nodes and instances are written in their current world-space positions
+        """
+        vertices, offsets, handles = self.polygons.packed()
+        stored = scene.Mesh(
+            vertices, offsets, self.polygons.colors(handles), self.polygons.kinds(handles),
+            self.polygons.cull(handles)
+        )
+        meshio.write_cache(path, scene.Mesh.join([stored, self.graph.flatten()] + [
+            instances.expand(instances.live()) for instances in self.instances.values()
+        ]))
+
+    def remove_polygon(self, handle: int) -> None:
+        """Removes the polygon with the given handle from the Model"""
+        self.polygons.remove(handle)
+        if self.index is not None:
+            self.index.remove(np.array([handle]))
+
+    def update_polygon(self, handle: int, *points: Vector3, color: scene.Color = None) -> None:
+        """Replaces the points and/or color of the polygon with the given handle"""
+        self.polygons.update(handle, points or None, color)
+        if self.index is not None and points:
+            polygon = self.polygons.polygon(handle)
+            self.index.insert(np.array([handle]), polygon.min(axis=0), polygon.max(axis=0))
+
+    def stored_polygons(self, observers: typing.Sequence[Observer] = None) -> scene.Mesh:
+        """Returns the polygons of the store that may be visible to any of the observers
+        Without a spatial index this is every stored polygon
+        """
+        if self.index is None:
+            vertices, offsets, handles = self.polygons.packed()
+        else:
+            handles = self.index.query(*self.frusta(observers))
+            vertices, offsets = self.polygons.gather(handles)
+        return scene.Mesh(
+            vertices, offsets, self.polygons.colors(handles), self.polygons.kinds(handles),
+            self.polygons.cull(handles)
+        )
+
+    def node_polygons(self, observers: typing.Sequence[Observer] = None) -> scene.Mesh:
+        """Returns the world-space polygons of scene graph nodes that may be visible to any of the
+        observers, without a spatial index this is every node
+        """
+        if self.index is None:
+            return self.graph.flatten()
+        return self.graph.visible(*self.frusta(observers))
+
+    def instanced(self, mesh: scene.Mesh) -> scene.Instances:
+        """Returns the instances of a shared mesh, registering the mesh the first time"""
+        instances = self.instances.get(mesh)
+        if instances is None:
+            index = spatial.Octree() if self.index is not None else None
+            instances = self.instances[mesh] = scene.Instances(mesh, index)
+        return instances
+
+    def add_instance(self, mesh: scene.Mesh, translation: Vector3, scale: float = 1,
+                     rotation: Rotation = None) -> int:
+        """Adds a copy of a shared mesh, placed by a scale, Rotation and then translation
+        Returns a handle to it within model.instanced(mesh), which can also add copies in bulk
+        """
+        rotations = None if rotation is None else rotation.matrix()[None]
+        return int(self.instanced(mesh).add(np.array([translation]), scale, rotations)[0])
+
+    def instanced_polygons(self, observers: typing.Sequence[Observer] = None) -> scene.Mesh:
+        """Returns the world-space polygons of every instance that may be visible to any observer"""
+        frustum = self.frusta(observers)
+        return scene.Mesh.join([
+            instances.expand(instances.visible(*frustum)) for instances in self.instances.values()
+        ])
+
+    def dynamic_polygons(self, observers: typing.Sequence[Observer] = None) -> scene.Mesh:
+        """Returns the scene graph and instanced polygons that may be visible to any observer"""
+        return scene.Mesh.join((self.node_polygons(observers), self.instanced_polygons(observers)))
+
+    def visible_polygons(self, observers: typing.Sequence[Observer] = None) -> scene.Mesh:
+        """Returns every stored, scene graph and instanced polygon that may be visible to any of
+        the observers, by default just the main observer
+        """
+        return scene.Mesh.join((self.stored_polygons(observers), self.dynamic_polygons(observers)))
+
+    def polygon_count(self) -> int:
+        """Returns the number of polygons in the Model, counting every instance"""
+        return len(self.polygons) + len(self.graph) + sum(
+            len(instances) * len(instances.mesh) for instances in self.instances.values()
+        )
+
+    def partition(self) -> bsp.BSPTree:
+        """Returns a BSP tree of every polygon, rebuilding it only if the scene has changed"""
+        if self._tree is None or self._treeVersion != self.polygons.version:
+            self._tree = bsp.BSPTree(*self.polygons.packed())
+            self._treeVersion = self.polygons.version
+        return self._tree
+
+    def ordered_polygons(self, observer: Observer = None) -> scene.Mesh:
+        """Returns the potentially visible polygons back to front as seen by an observer,
+        by default the main observer.
+        Stored polygons are drawn as BSP fragments, pieces of polygons cut by the tree colored
+        as their source polygons. Scene graph and instanced polygons move, so rather than
+        being built into the tree they are pushed down it each frame to find their place
+        """
+        observer = observer or self.observer
+        tree = self.partition()
+        # Drop fragments of polygons outside the view
+        fragments = np.arange(len(tree.sources))
+        if self.index is not None:
+            fragments = fragments[np.isin(tree.sources, self.index.query(*observer.frustum()))]
+        vertices, offsets = tree.fragments(fragments)
+        sources = tree.sources[fragments]
+        stored = scene.Mesh(
+            vertices, offsets, self.polygons.colors(sources), self.polygons.kinds(sources),
+            self.polygons.cull(sources)
+        )
+
+        # Nearest depth of each moving polygon, ordering those that land in the same place
+        dynamic = self.dynamic_polygons([observer])
+        depth = np.empty(0)
+        if len(dynamic):
+            relative = self.transform_points(dynamic.vertices[:dynamic.offsets[-1]], observer)
+            depth = np.minimum.reduceat(relative[:, 2], dynamic.offsets[:-1])
+        order = tree.merge(observer.origin, dynamic.vertices, dynamic.offsets, depth)
+
+        # Index of each ordered entry among the kept fragments followed by the moving polygons
+        extra = order >= len(tree.sources)
+        kept = np.isin(order, fragments) | extra
+        order, extra = order[kept], extra[kept]
+        order = np.where(
+            extra, order - len(tree.sources) + len(fragments), np.searchsorted(fragments, order)
+        )
+        return scene.Mesh.join((stored, dynamic)).select(order)
+
+    def add_wire_cube(self, center: Vector3, radius: float) -> int:
+        """Draws a wire-frame cube with points <radius> away from <center>
+        Returns a handle to the instance within model.instanced(WIRE_CUBE)
+        """
+        return self.add_instance(WIRE_CUBE, center, radius)
+
+    def add_cube(self, center: Vector3, radius: float) -> int:
+        """Draws a solid-face cube with points <radius> away from <center>
+        Returns a handle to the instance within model.instanced(SOLID_CUBE)
+        """
+        return self.add_instance(SOLID_CUBE, center, radius)
+
+    def transform_points(self, points: np.ndarray, observer: Observer = None) -> np.ndarray:
+        """Returns an (n, 3) array of points transformed to coordinates relative to an observer,
+        by default the main observer.
+        Batched equivalent of transformed, translating and rotating every row at once
+        """
+        observer = observer or self.observer
+        # Translate every point and then rotate with a single matrix product
+        origin = np.asarray(observer.origin, dtype=float)
+        return (np.asarray(points, dtype=float) - origin) @ observer.orientation.matrix().T
+
+    def transform_views(self, points: np.ndarray,
+                        observers: typing.Sequence[Observer]) -> np.ndarray:
+        """Returns a (v, n, 3) array of points transformed relative to each of v observers
+        Every view is translated and rotated in a single stacked matrix product
+        """
+        origins = np.array([tuple(observer.origin) for observer in observers], dtype=float)
+        matrices = np.stack([observer.orientation.matrix() for observer in observers])
+        return np.matmul(
+            np.asarray(points, dtype=float)[None] - origins[:, None], matrices.transpose(0, 2, 1)
+        )
+
+    def project_points(self, points: np.ndarray,
+                       observer: Observer = None) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns an (n, 2) array of points projected onto the viewport of an observer,
+        by default the main observer, and a mask of valid rows.
+        Batched equivalent of projected, rows that do not project are left as nan
+        Does not transform the points first
+        """
+        observer = observer or self.observer
+        points = np.asarray(points, dtype=float)
+        # Only points in front of the observer project
+        valid = points[:, 2] > 0
+        # Perspective divide, using nan for points behind the observer
+        scale = np.full(len(points), np.nan)
+        np.divide(observer.focal, points[:, 2], out=scale, where=valid)
+        return points[:, :2] * scale[:, None], valid
 
     def transformed(self, point: Vector3) -> pygame.Vector3:
         """Returns a point transformed to relative coordinates based on Model observer
         Rotates so that the observer faces into the positive z-axis
         """
-        # Translate and then rotate the point
-        return self.observer.orientation.rotate(point - self.observer.origin)
+        return Vector3(*self.transform_points(np.array([point]))[0])
 
     def projected(self, point: Vector3) -> pygame.Vector2:
         """Returns a point  projected onto the viewpoint based on the observer
         Returns None if the point does not project onto the viewpoint
         Does not transform the point first
         """
-        # Check if point projects
-        if point.z > 0:
-            # Project onto viewport
-            point = pygame.Vector2(
-                self.observer.focal/point.z * point.x,
-                self.observer.focal/point.z * point.y
-            )
-            # Return projected point
-            return point
-        else:
-            # Point is not in front of observer, so not projected
+        projected, valid = self.project_points(np.array([point]))
+        # Point is not in front of observer, so not projected
+        if not valid[0]:
             return None
-
-    def visual(self) -> pygame.Surface:
-
-        # Create blank surface for observation window
-        output = base.Panel(
-            pygame.Surface(self.observer.window),
-            origin=base.Point(self.observer.window)/2,
-            orientation=(1, -1)
+        return pygame.Vector2(*projected[0])
+
+    def _observed(self) -> typing.Tuple[Vector3, Quaternion]:
+        """Returns a copy of the observer origin and orientation quaternion"""
+        return Vector3(self.observer.origin), Quaternion(self.observer.orientation.quaternion)
+
+    def _observe(self, state: typing.Tuple[Vector3, Quaternion]) -> None:
+        """Moves the observer to a copied (origin, quaternion) state"""
+        self.observer.origin = Vector3(state[0])
+        self.observer.orientation.quaternion = Quaternion(state[1])
+
+    def update(self):
+        # Undo any interpolation, and remember where the observer was before it is moved
+        if self._latest is not None:
+            self._observe(self._latest)
+            self._latest = None
+        self._previous = self._observed()
+
+    def interpolate(self, alpha: float):
+        # Draw the observer between where it was before and after the latest update
+        if self._previous is None:
+            return
+        if self._latest is None:
+            self._latest = self._observed()
+        (start, rotation), (end, target) = self._previous, self._latest
+        self.observer.origin = start.lerp(end, alpha) if start != end else Vector3(end)
+        # Identical orientations are copied exactly, so a still observer keeps its fingerprint
+        self.observer.orientation.quaternion = (
+            Quaternion.slerp(rotation, target, alpha) if rotation != target else Quaternion(target)
         )
 
-        # Transform the polygons based on observer
-        polygons = [
-            tuple(self.transformed(point) for point in polygon)
-            for polygon in self.polygons
-        ]
-
-        # Sort the polygons by depth
-        # TODO use a more intelligent sorting method than a random point depth
-        # should determine closest point or something
-        polygons = sorted(
-            polygons,
-            # Sort by the distance to the closest point of the polygon
-            key=lambda polygon: sorted(polygon, key=lambda point: point.z)[0].z,
-            reverse=True
+    def fingerprint(self):
+        # Scene contents, viewpoint and anything changing how the scene is drawn
+        return (
+            self.polygons.version, self.graph.version,
+            tuple(instances.version for instances in self.instances.values()),
+            self.observer.fingerprint(),
+            self.ordering, self.backend, self.rasterizer.borders, self.detail
         )
 
-        # Draw each polygon
-        for polygon in polygons:
-
-            # Project point
-            polygon = [self.projected(point) for point in polygon]
+    def visual(self, panel: base.Panel = None) -> base.Panel:
 
-            # Draw if no issues
-            if not None in polygon:
-                try:
-                    output.draw_polygon(polygon)
-                except ValueError:
-                    output.draw_line(*polygon)
-
-        # Return the finished output
+        # Get a blank panel for the observation window
+        output = self.canvas(
+            self.observer.window,
+            origin=base.Point(self.observer.window)/2,
+            orientation=(1, -1), panel=panel
+        )
+        mesh, fixed = self._gather([self.observer])
+        # Transform every vertex at once
+        with profiler.stage("visual.transform"):
+            vertices = self.transform_points(mesh.vertices)
+        self._view(output, mesh, vertices, fixed, self.observer, self._lowres)
         return output
 
+    def visuals(self, panels: typing.Sequence[base.Panel] = None,
+                observers: typing.Sequence[Observer] = None) -> typing.List[base.Panel]:
+        """Returns a Panel of the scene seen by each observer, by default every one of observers
+        Draws on the given panels if provided, one per observer.
+        Polygons visible to any observer are gathered once and transformed for every view in a
+        single product, leaving only clipping and drawing per view. With the bsp ordering
+        the order of polygons depends on the viewpoint, so each view is gathered separately
+        """
+        observers = self.observers if observers is None else list(observers)
+        while len(self._views) < len(observers):
+            self._views.append((base.PanelBuffer(), base.PanelBuffer()))
+
+        # Get a blank panel for each observation window
+        outputs = []
+        for index, observer in enumerate(observers):
+            origin = base.Point(observer.window)/2
+            if panels is None:
+                outputs.append(self._views[index][0].next(observer.window, origin, (1, -1)))
+            else:
+                panels[index].reset(origin, (1, -1))
+                outputs.append(panels[index])
+
+        if self.backend == "painter" and self.ordering == "bsp":
+            for output, observer, (_, lowres) in zip(outputs, observers, self._views):
+                mesh, fixed = self._gather([observer])
+                with profiler.stage("visual.transform"):
+                    vertices = self.transform_points(mesh.vertices, observer)
+                self._view(output, mesh, vertices, fixed, observer, lowres)
+            return outputs
+
+        # Shared polygons, transformed for every view at once
+        mesh, _ = self._gather(observers)
+        with profiler.stage("visual.transform"):
+            views = self.transform_views(mesh.vertices, observers)
+        for output, observer, vertices, (_, lowres) in zip(outputs, observers, views, self._views):
+            self._view(output, mesh, vertices, 0, observer, lowres)
+        return outputs
+
+    def _gather(self, observers: typing.Sequence[Observer]) -> typing.Tuple[scene.Mesh, int]:
+        """Returns the polygons that may be visible to any of the observers,
+        of which the first <fixed> are already ordered for a single observer
+        """
+        with profiler.stage("visual.gather"):
+            if self.backend == "painter" and self.ordering == "bsp" and len(observers) == 1:
+                ordered = self.ordered_polygons(observers[0])
+                return ordered, len(ordered)
+            # Depth sorted, or resolved per pixel by the zbuffer
+            return self.visible_polygons(observers), 0
+
+    def _view(self, output: base.Panel, mesh: scene.Mesh, vertices: np.ndarray, fixed: int,
+              observer: Observer, lowres: base.PanelBuffer) -> None:
+        """Draws polygons with vertices relative to the observer onto a Panel,
+        at a lower resolution scaled up if the detail calls for it
+        """
+        if self.detail.scale >= 1:
+            self._draw(output, mesh, vertices, fixed, observer)
+            return
+
+        # Draw at a lower resolution, then scale up to the window
+        window = output.surface.get_size()
+        size = tuple(max(int(side * self.detail.scale), 1) for side in window)
+        target = lowres.next(size, origin=base.Point(size)/2, orientation=(1, -1))
+        self._draw(target, mesh, vertices, fixed, observer, size[0] / window[0])
+        with profiler.stage("visual.upscale"):
+            pygame.transform.scale(target.surface, window, output.surface)
+
+    def _draw(self, output: base.Panel, mesh: scene.Mesh, vertices: np.ndarray, fixed: int,
+              observer: Observer, scale: float = 1.0) -> None:
+        """Draws polygons with vertices relative to the observer onto a Panel,
+        of which the first <fixed> are already ordered, scaling projected points
+        """
+        offsets = mesh.offsets
+
+        # Nothing to draw
+        if not len(mesh):
+            return
+
+        # Drop faces turned away, then cut what remains to the visible volume
+        with profiler.stage("visual.clip"):
+            front = np.arange(len(mesh))
+            if mesh.cull is not None:
+                front = np.flatnonzero(~clipping.backfaces(vertices, offsets, mesh.cull))
+                gather, offsets = scene.ranges(offsets[front], np.diff(offsets)[front])
+                vertices = vertices[gather]
+            # Depth of each polygon before clipping, so cut polygons keep their place in the order
+            depth = np.minimum.reduceat(vertices[:, 2], offsets[:-1]) if len(front) else front
+            vertices, offsets, sources = clipping.clip(vertices, offsets, *observer.planes())
+            depth = np.maximum(depth[sources], observer.near)
+            sources = front[sources]
+            colors = mesh.colors[sources]
+            # Already ordered polygons stay at the front
+            fixed = int(np.searchsorted(sources, fixed))
+
+        # Nothing left to draw
+        if len(offsets) < 2:
+            return
+
+        # Every remaining point is in front of the observer, so projects
+        with profiler.stage("visual.project"):
+            projected, _ = self.project_points(vertices, observer)
+
+        # Drop polygons too small on screen to matter
+        if self.detail.minSize:
+            with profiler.stage("visual.decimate"):
+                starts = offsets[:-1]
+                extent = (
+                    np.maximum.reduceat(projected, starts) - np.minimum.reduceat(projected, starts)
+                )
+                keep = np.flatnonzero(extent.max(axis=1) >= self.detail.minSize)
+                gather, offsets = scene.ranges(offsets[keep], np.diff(offsets)[keep])
+                vertices, projected = vertices[gather], projected[gather]
+                depth, sources, colors = depth[keep], sources[keep], colors[keep]
+                fixed = int(np.searchsorted(keep, fixed))
+            if len(offsets) < 2:
+                return
+
+        # Points and lines are drawn as strokes, everything else filled
+        if mesh.kinds is None:
+            strokes = np.diff(offsets) < 3
+        else:
+            strokes = mesh.kinds[sources] <= scene.LINE
+
+        # Replace every polygon by its edges
+        if self.detail.wireframe and not strokes.all():
+            with profiler.stage("visual.wireframe"):
+                starts, ends, owners = scene.edges(offsets)
+                vertices = np.stack((vertices[starts], vertices[ends]), axis=1).reshape(-1, 3)
+                projected = np.stack((projected[starts], projected[ends]), axis=1).reshape(-1, 2)
+                offsets = np.arange(len(owners) + 1) * 2
+                depth, sources, colors = depth[owners], sources[owners], colors[owners]
+                fixed = int(np.searchsorted(owners, fixed))
+                strokes = np.ones(len(owners), dtype=bool)
+        projected = projected * scale if scale != 1 else projected
+
+        if self.backend == "zbuffer":
+            # Rasterize every polygon in one pass
+            with profiler.stage("visual.rasterize"):
+                self.rasterizer.render(
+                    output, projected, vertices[:, 2], offsets, colors,
+                    self.rasterizer.borders and self.detail.borders, strokes
+                )
+            return
+
+        with profiler.stage("visual.sort"):
+            # Sort the polygons by depth, using the distance to the closest point of each polygon
+            # This can be wrong for overlapping polygons, which the bsp ordering handles
+            order = np.arange(len(sources))
+            if fixed < len(sources):
+                order[fixed:] = fixed + np.argsort(-depth[fixed:], kind="stable")
+
+        # Draw every polygon furthest first, in one batch per run of strokes or filled polygons
+        with profiler.stage("visual.draw"):
+            strokes, colors = strokes[order], colors[order]
+            starts, counts = offsets[order], np.diff(offsets)[order]
+            bounds = np.concatenate(([0], np.flatnonzero(np.diff(strokes)) + 1, [len(order)]))
+            for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                if strokes[first]:
+                    # From the first to the last point, so points are drawn as a dot
+                    begin = starts[first:last]
+                    ends = np.stack((begin, begin + counts[first:last] - 1), axis=1)
+                    output.draw_lines(projected[ends], colors[first:last])
+                else:
+                    gather, ordered = scene.ranges(starts[first:last], counts[first:last])
+                    output.draw_polygons(
+                        projected[gather], ordered, colors[first:last], int(self.detail.borders)
+                    )
+
 class ProjectionManager(base.Manager):
     """Manager Class for the Projection Model"""
 
-    def __init__(self, model: base.Model, screen: pygame.Surface, controller: Controller):
+    # The position readout of the HUD
+    subsystems = ("font",)
+    fonts = (("default", 30),)
+
+    def __init__(self, model: base.Model, screen: pygame.Surface, controller: Controller,
+                 governor: Governor[Detail] = None):
         # Delegate super init
         super().__init__(model, screen)
 
         # Reference controller
         self.controller = controller
 
-    def update(self, events, keyboard):
-        """UP/DOWN arrowkeys change order, Holding LEFT/RIGHT change size"""
+        # Optional governor, choosing the Detail of the Projection from render times
+        self.governor = governor
+
+        # Panel of the whole screen, for drawing the HUD
+        self.hud = base.Panel(screen)
+
+        # Fingerprint of the Projection and position text last drawn, with the area of the text
+        self._shown = None
+        self._text = None
+        self._textRect: typing.Optional[pygame.Rect] = None
+
+    def control(self, events, keyboard):
+        """WASDQE pan the observer, arrowkeys and ,/. rotate it"""
 
         # Search for Keypresses
         for event in events:
@@ -238,19 +796,56 @@ class ProjectionManager(base.Manager):
         # Compose the new rotation on the the main
         self.model.observer.orientation.compose(rotation)
 
-        # Refresh the display
-        image = self.model.visual()
-
-        # Temporary debug information
-        # Convert to readable strings
-        pos = self.model.observer.origin
-        position = f"<{pos.x:.1f}, {pos.y:.1f}, {pos.z:.1f}>"
+    def step(self, events, keyboard):
+        """Advances the Projection, then moves the observer based on held keys"""
+        with profiler.stage("manager.input"):
+            self.model.update()
+            self.control(events, keyboard)
 
-        # Create and display text
-        font = pygame.font.SysFont("default", 30)
-        text = font.render(position, True, (255, 255, 255), (0, 0, 0))
-        image.surface.blit(text, (0, 0))
-
-        # Draw the image (to 0, 0 for now)
-        image.display(self.screen, (0, 0))
-    
\ No newline at end of file
+    def update(self, events, keyboard):
+        """Draws the Projection and position, returning the changed rectangles"""
+        changed = []
+
+        # Refresh the display, reusing the last frame if nothing changed
+        with profiler.stage("manager.render"):
+            fingerprint = self.model.fingerprint()
+            start = time.perf_counter()
+            image = self.model.render()
+            elapsed = time.perf_counter() - start
+        fresh = fingerprint is None or fingerprint != self._shown
+        redraw = not self.valid or fresh
+
+        # Adjust the detail of later frames to the time of this one, if it was drawn anew
+        if self.governor is not None and fresh and self.governor.record(elapsed):
+            self.model.detail = self.governor.setting
+
+        # Draw the image (to 0, 0 for now), only if the screen does not already show it
+        if redraw:
+            with profiler.stage("manager.display"):
+                image.display(self.screen, (0, 0))
+                changed.append(image.surface.get_rect())
+                self._shown = fingerprint
+
+        with profiler.stage("manager.hud"):
+            # Temporary debug information
+            # Convert to readable strings
+            pos = self.model.observer.origin
+            position = f"<{pos.x:.1f}, {pos.y:.1f}, {pos.z:.1f}>"
+
+            if redraw or position != self._text:
+                # Put back the image under the previous text, which may have been longer
+                if not redraw and self._textRect is not None:
+                    self.screen.blit(image.surface, self._textRect, self._textRect)
+                    changed.append(self._textRect)
+
+                # Text repainted over a new image while the observer only turns is cached,
+                # while a moving position is rendered directly so it does not churn the cache
+                draw = base.overlay.text if position == self._text else base.overlay.readout
+                self._textRect = draw(
+                    self.hud, position, (0, 0), "default", 30, (255, 255, 255), (0, 0, 0)
+                )
+                self._text = position
+                changed.append(self._textRect)
+
+        self.valid = True
+        return changed
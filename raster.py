@@ -0,0 +1,298 @@
+"""Depth-buffered software rasterization of projected polygons into a pygame Surface"""
+
+from __future__ import annotations
+
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame
+
+import base
+import scene
+
+# Maximum number of candidate pixels examined by a single batch of array operations
+BATCH = 1 << 21
+
+# Relative depth tolerance letting lines and borders win against the faces they lie on
+LINE_BIAS = 1e-3
+
+# Region of the buffers as (left, top, right, bottom), right and bottom exclusive
+Region = typing.Tuple[int, int, int, int]
+
+class Rasterizer:
+    """Draws polygons into a depth buffer with array operations, then blits it onto a Panel\n
+        Depth is stored as 1/z, which interpolates linearly in screen space,
+        so intersecting polygons are resolved per pixel rather than per polygon.
+        Polygons are fan-triangulated, and lines (and optional borders) are sampled per pixel.
+        With several workers the window is split into square tiles rasterized on a thread pool;
+        tiles own disjoint pixels and numpy releases the GIL, so output is identical to one worker
+    """
+
+    def __init__(self, borders: bool = True,
+                 borderColor: typing.Tuple[int, int, int] = (255, 255, 255),
+                 workers: int = 1, tile: int = 128):
+
+        # Whether to outline polygons like base.Panel.draw_polygon
+        self.borders = borders
+        self.borderColor = borderColor
+
+        # Parallelism, where tiles are squares of the given side length
+        self.workers = workers
+        self.tile = tile
+        self._pool = None
+        self._poolSize = 0
+
+        # Buffers indexed [x, y] like pygame.surfarray, reallocated only when the size changes
+        self.depth = np.zeros((0, 0))
+        self.color = np.zeros((0, 0, 3), dtype=np.uint8)
+
+    def clear(self, size: typing.Tuple[int, int]) -> None:
+        """Clears the buffers to black and infinitely far, resizing them if needed"""
+        if self.depth.shape != tuple(size):
+            self.depth = np.zeros(size)
+            self.color = np.zeros(tuple(size) + (3,), dtype=np.uint8)
+        else:
+            self.depth.fill(0)
+            self.color.fill(0)
+
+    def render(self, panel: base.Panel, points: np.ndarray, depths: np.ndarray,
+               offsets: np.ndarray, colors: np.ndarray, borders: bool = None,
+               strokes: np.ndarray = None) -> None:
+        """Rasterizes polygons onto the Panel
+        points are (n, 2) projected Panel coordinates and depths their (n,) positive z values,
+        polygon i is made of rows offsets[i]:offsets[i + 1] and has the color colors[i].
+        borders overrides whether polygons are outlined for this render only.
+        strokes marks the polygons drawn as the line from their first to last point, such as
+        points and lines, while the rest are filled. By default those with fewer than 3 points
+        """
+        size = panel.surface.get_size()
+        self.clear(size)
+
+        if len(offsets) > 1:
+            # Convert to surface pixel coordinates, and store depth as 1/z
+            screen = np.empty((len(points), 3))
+            screen[:, 0] = panel.origin.x + points[:, 0] * panel.orientation.x
+            screen[:, 1] = panel.origin.y + points[:, 1] * panel.orientation.y
+            screen[:, 2] = 1 / depths
+
+            colors = np.asarray(colors, dtype=np.uint8)
+            if strokes is None:
+                strokes = np.diff(offsets) < 3
+            triangles, triangleColors = self._triangulate(screen, offsets, colors, ~strokes)
+            setup = self._setup(triangles)
+            borders = self.borders if borders is None else borders
+            samples = self._samples(*self._segments(screen, offsets, colors, strokes, borders))
+
+            if self.workers > 1:
+                # Rasterize tiles concurrently, each writing only its own pixels
+                if self._pool is None or self._poolSize != self.workers:
+                    if self._pool is not None:
+                        self._pool.shutdown()
+                    self._pool = ThreadPoolExecutor(self.workers)
+                    self._poolSize = self.workers
+                list(self._pool.map(
+                    lambda region: self._draw(region, setup, triangleColors, samples),
+                    self.tiles(size)
+                ))
+            else:
+                self._draw((0, 0) + tuple(size), setup, triangleColors, samples)
+
+        # Publish the color buffer to the surface in one copy
+        pygame.surfarray.blit_array(panel.surface, self.color)
+
+    def tiles(self, size: typing.Tuple[int, int]) -> typing.List[Region]:
+        """Returns the regions the window is split into for parallel rendering"""
+        return [
+            (left, top, min(left + self.tile, size[0]), min(top + self.tile, size[1]))
+            for top in range(0, size[1], self.tile)
+            for left in range(0, size[0], self.tile)
+        ]
+
+    def _draw(self, region: Region, setup: typing.Tuple[np.ndarray, ...], colors: np.ndarray,
+              samples: typing.Tuple[np.ndarray, ...]) -> None:
+        """Rasterizes triangles and then line samples into a single region of the buffers"""
+        self._triangles(region, setup, colors)
+        x, y, w, color = samples
+        left, top, right, bottom = region
+        inside = (x >= left) & (x < right) & (y >= top) & (y < bottom)
+        self._resolve(x[inside], y[inside], w[inside], color[inside], LINE_BIAS)
+
+    @staticmethod
+    def _triangulate(screen: np.ndarray, offsets: np.ndarray, colors: np.ndarray,
+                     filled: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (n, 3, 3) fan triangulation of every filled polygon"""
+        counts = np.diff(offsets)
+        polygons = np.flatnonzero(filled & (counts >= 3))
+        triangles = counts[polygons] - 2
+        owner = np.repeat(polygons, triangles)
+        # Second corner of each triangle, running from the second to the second last point
+        second, _ = scene.ranges(offsets[polygons] + 1, triangles)
+        corners = np.stack((offsets[owner], second, second + 1), axis=1)
+        return screen[corners], colors[owner]
+
+    def _segments(self, screen: np.ndarray, offsets: np.ndarray, colors: np.ndarray,
+                  strokes: np.ndarray, borders: bool) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (n, 2, 3) segments of every stroke, from its first to last point,
+        followed by the borders of filled polygons if enabled
+        """
+        counts = np.diff(offsets)
+        lines = np.flatnonzero(strokes)
+        segments = [np.stack((offsets[lines], offsets[lines + 1] - 1), axis=1)]
+        segmentColors = [colors[lines]]
+        polygons = np.flatnonzero(~strokes & (counts >= 3))
+        if borders and len(polygons):
+            # Every point of every polygon starts an edge to the following point
+            start, _ = scene.ranges(offsets[polygons], counts[polygons])
+            end = scene.adjacent(offsets)[start]
+            segments.append(np.stack((start, end), axis=1))
+            segmentColors.append(np.broadcast_to(
+                np.asarray(self.borderColor, dtype=np.uint8), (len(start), 3)
+            ))
+        return screen[np.concatenate(segments)], np.concatenate(segmentColors)
+
+    def _resolve(self, x: np.ndarray, y: np.ndarray, w: np.ndarray, color: np.ndarray,
+                 bias: float = 0) -> None:
+        """Writes fragments that are nearer than the depth buffer, keeping the nearest per pixel"""
+        height = self.depth.shape[1]
+        pixel = x * height + y
+        depth = self.depth.reshape(-1)
+
+        # Depth test against what has already been drawn
+        nearer = w * (1 + bias) > depth[pixel]
+        pixel, w, color = pixel[nearer], w[nearer], color[nearer]
+
+        # Nearest remaining fragment of each pixel, by scattering the maximum 1/z into the buffer
+        depth[pixel] = -np.inf
+        np.maximum.at(depth, pixel, w)
+        nearest = np.flatnonzero(w == depth[pixel])
+        # Equally near fragments go to whichever came first
+        _, first = np.unique(pixel[nearest], return_index=True)
+        nearest = nearest[first]
+        self.color.reshape(-1, 3)[pixel[nearest]] = color[nearest]
+
+    @staticmethod
+    def _setup(triangles: np.ndarray) -> typing.Tuple[np.ndarray, ...]:
+        """Returns (coefficients, low, high, keep) for rasterizing (n, 3, 3) triangles
+        of (x, y, 1/z).
+        coefficients[:, i] gives a * x + b * y + c for barycentric weight i (i < 3) and 1/z (i = 3),
+        low and high are the pixel bounds of each triangle, and keep excludes degenerate triangles
+        """
+        # Signed doubled area, dropping degenerate triangles (their borders are still drawn)
+        a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        keep = np.abs(area) > 1e-12
+        area = np.where(keep, area, 1)
+
+        # Edge functions opposite each corner, normalized into barycentric weights
+        coefficients = np.empty((len(triangles), 4, 3))
+        for i in range(3):
+            start, end = triangles[:, (i + 1) % 3], triangles[:, (i + 2) % 3]
+            coefficients[:, i, 0] = -(end[:, 1] - start[:, 1]) / area
+            coefficients[:, i, 1] = (end[:, 0] - start[:, 0]) / area
+            coefficients[:, i, 2] = (
+                (end[:, 1] - start[:, 1]) * start[:, 0] - (end[:, 0] - start[:, 0]) * start[:, 1]
+            ) / area
+        # 1/z is linear in screen space, so it is a weighted sum of the edge functions
+        coefficients[:, 3] = (coefficients[:, :3] * triangles[:, :, 2, None]).sum(axis=1)
+
+        # Pixel bounding box of each triangle, sampled at pixel centers
+        low = np.ceil(triangles[:, :, :2].min(axis=1) - 0.5)
+        high = np.floor(triangles[:, :, :2].max(axis=1) - 0.5)
+        return coefficients, low, high, keep
+
+    def _triangles(self, region: Region, setup: typing.Tuple[np.ndarray, ...],
+                   colors: np.ndarray) -> None:
+        """Rasterizes prepared triangles within a region"""
+        left, top, right, bottom = region
+        coefficients, low, high, keep = setup
+
+        # Clamp bounding boxes to the region, skipping triangles outside it
+        low = np.maximum(low, (left, top))
+        high = np.minimum(high, (right - 1, bottom - 1))
+        keep = keep & (high >= low).all(axis=1)
+        coefficients, colors = coefficients[keep], colors[keep]
+        low = low[keep].astype(np.int64)
+        spans = high[keep].astype(np.int64) - low + 1
+        sizes = spans[:, 0] * spans[:, 1]
+
+        # Work through the triangles in batches of bounded candidate pixel count
+        start = 0
+        while start < len(sizes):
+            end = start + max(1, int(np.searchsorted(
+                np.cumsum(sizes[start:]), BATCH, side="right"
+            )))
+            self._triangle_batch(
+                coefficients[start:end], colors[start:end],
+                low[start:end], spans[start:end], sizes[start:end]
+            )
+            start = end
+
+    def _triangle_batch(self, coefficients, colors, low, spans, sizes) -> None:
+        """Rasterizes a batch of triangles one scanline span at a time
+        The covered range of each row comes from solving the three edge functions for x,
+        so only pixels inside a triangle are ever generated
+        """
+        # Every row of every bounding box
+        owner = np.repeat(np.arange(len(sizes)), spans[:, 1])
+        y, _ = scene.ranges(low[:, 1], spans[:, 1])
+        py = y + 0.5
+
+        # Narrow each row to where every edge function is non-negative at pixel centers
+        first = low[owner, 0].astype(float)
+        last = first + spans[owner, 0] - 1
+        for i in range(3):
+            plane = coefficients[owner, i]
+            rest = plane[:, 1] * py + plane[:, 2]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                bound = -rest / plane[:, 0] - 0.5
+            rising, falling = plane[:, 0] > 0, plane[:, 0] < 0
+            first = np.where(rising, np.maximum(first, np.ceil(bound)), first)
+            last = np.where(falling, np.minimum(last, np.floor(bound)), last)
+            # Edges parallel to the row either cover all of it or none of it
+            last = np.where((plane[:, 0] == 0) & (rest < 0), first - 1, last)
+        counts = np.maximum(last - first + 1, 0).astype(np.int64)
+
+        # Expand the spans into pixels
+        span = np.repeat(np.arange(len(counts)), counts)
+        x, _ = scene.ranges(first.astype(np.int64), counts)
+        owner, y = owner[span], y[span]
+
+        plane = coefficients[owner, 3]
+        w = plane[:, 0] * (x + 0.5) + plane[:, 1] * (y + 0.5) + plane[:, 2]
+        self._resolve(x, y, w, colors[owner])
+
+    def _samples(self, segments: np.ndarray, colors: np.ndarray) -> typing.Tuple[np.ndarray, ...]:
+        """Returns (x, y, 1/z, color) samples of (n, 2, 3) screen-space segments at each pixel step
+        Segments are clipped to the whole window, so samples do not depend on tiling
+        """
+        width, height = self.depth.shape
+        start, delta = segments[:, 0], segments[:, 1] - segments[:, 0]
+
+        # Clip each segment to the window so only on-screen pixels are sampled (Liang-Barsky)
+        enter, leave = np.zeros(len(segments)), np.ones(len(segments))
+        for axis, limit in ((0, width), (1, height)):
+            moving = delta[:, axis] != 0
+            # Segments parallel to this boundary are kept only if they lie within it
+            within = (start[:, axis] >= 0) & (start[:, axis] < limit)
+            leave = np.where(moving | within, leave, -1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                low = -start[:, axis] / delta[:, axis]
+                high = (limit - start[:, axis]) / delta[:, axis]
+            enter = np.where(moving, np.maximum(enter, np.minimum(low, high)), enter)
+            leave = np.where(moving, np.minimum(leave, np.maximum(low, high)), leave)
+        keep = enter <= leave
+        start = start[keep] + delta[keep] * enter[keep, None]
+        end = segments[keep, 0] + delta[keep] * leave[keep, None]
+        colors = colors[keep]
+        steps = np.ceil(np.abs(end[:, :2] - start[:, :2]).max(axis=1)).astype(np.int64) + 1
+
+        owner = np.repeat(np.arange(len(steps)), steps)
+        local, _ = scene.ranges(np.zeros(len(steps)), steps)
+        t = local / np.maximum(steps[owner] - 1, 1)
+        samples = start[owner] + (end[owner] - start[owner]) * t[:, None]
+
+        x = np.floor(samples[:, 0]).astype(np.int64)
+        y = np.floor(samples[:, 1]).astype(np.int64)
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        return x[inside], y[inside], samples[inside, 2], colors[owner[inside]]
@@ -0,0 +1,587 @@
+"""Compact array-backed storage of 3D geometry for Models such as Projection"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+import spatial
+
+Color = typing.Tuple[int, int, int]
+
+# Kinds of primitive, decided once when polygons are added
+# POLYGON is an n-gon with every point on one plane, and BENT one without
+POINT, LINE, TRIANGLE, POLYGON, BENT = range(5)
+
+# Distance, relative to the size of the coordinates, within which points coincide
+TOLERANCE = 1e-6
+
+def _grow(array: np.ndarray, needed: int) -> np.ndarray:
+    """Returns the array, or a copy with doubled capacity if it cannot hold <needed> rows"""
+    if needed <= len(array):
+        return array
+    # Double so repeated appends stay amortized O(1), but bulk appends allocate exactly
+    capacity = max(needed, 2 * len(array), 16)
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+def ranges(starts: np.ndarray, counts: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Returns (indices, offsets) concatenating the index ranges starts[i]:starts[i] + counts[i]
+    Range i occupies indices[offsets[i]:offsets[i + 1]], built without a Python loop
+    """
+    offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    indices = np.repeat(np.asarray(starts, dtype=np.intp) - offsets[:-1], counts)
+    indices += np.arange(offsets[-1])
+    return indices, offsets
+
+def sizes(vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Returns the largest absolute coordinate of each polygon, at least 1
+    Tolerances scale with it, so a polygon is judged by its own coordinates alone
+    """
+    return np.maximum(np.maximum.reduceat(np.abs(vertices).max(axis=1), offsets[:-1]), 1.0)
+
+def adjacent(offsets: np.ndarray, step: int = 1) -> np.ndarray:
+    """Returns the index of the following vertex of each vertex, wrapping within each polygon
+    A step of -1 gives the preceding vertex instead
+    """
+    neighbors = np.arange(step, offsets[-1] + step)
+    if step > 0:
+        neighbors[offsets[1:] - 1] = offsets[:-1]
+    else:
+        neighbors[offsets[:-1]] = offsets[1:] - 1
+    return neighbors
+
+def edges(offsets: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the (starts, ends, owners) vertex indices and polygon of every edge
+    Polygons have an edge from each point to the next, lines are their own edge
+    and points are a zero length edge
+    """
+    counts = np.diff(offsets)
+    number = np.where(counts >= 3, counts, np.minimum(counts, 1))
+    starts, _ = ranges(offsets[:-1], number)
+    return starts, adjacent(offsets)[starts], np.repeat(np.arange(len(counts)), number)
+
+def classify(vertices: np.ndarray,
+             offsets: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns (vertices, offsets, kinds) of polygons with degenerate geometry collapsed
+    Repeated points are merged, and polygons without area become the line between their
+    furthest points, so every polygon is a POINT, LINE, TRIANGLE, planar POLYGON or BENT n-gon.
+    Raises ValueError if any point is not finite
+    """
+    offsets = np.asarray(offsets, dtype=np.intp)
+    vertices = np.asarray(vertices, dtype=float)[offsets[0]:offsets[-1]]
+    offsets = offsets - offsets[0]
+    if not np.isfinite(vertices).all():
+        raise ValueError("Polygon points must be finite")
+    if len(offsets) < 2:
+        return vertices, offsets, np.empty(0, dtype=np.uint8)
+    if (np.diff(offsets) < 1).any():
+        raise ValueError("Polygons must have at least one point")
+    tolerance = TOLERANCE * sizes(vertices, offsets)
+
+    # Drop points equal to the one before them, but never every point of a polygon
+    spread = np.repeat(tolerance, np.diff(offsets))
+    keep = np.abs(vertices - vertices[adjacent(offsets, -1)]).max(axis=1) > spread
+    keep[offsets[:-1]] |= np.add.reduceat(keep, offsets[:-1]) == 0
+    counts = np.add.reduceat(keep, offsets[:-1])
+    vertices = vertices[keep]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+
+    kinds = np.full(len(counts), POLYGON, dtype=np.uint8)
+    kinds[counts == 1] = POINT
+    kinds[counts == 2] = LINE
+    kinds[counts == 3] = TRIANGLE
+
+    # Twice the area vector of each polygon, which vanishes when the points are collinear
+    polygons = np.flatnonzero(counts >= 3)
+    if len(polygons):
+        gather, local = ranges(offsets[polygons], counts[polygons])
+        points = vertices[gather]
+        areas = np.add.reduceat(np.cross(points[adjacent(local, -1)], points), local[:-1])
+        length = np.linalg.norm(areas, axis=1)
+        flat = length <= tolerance[polygons] ** 2
+        kinds[polygons[flat]] = LINE
+
+        # n-gons with a point off the plane through their center are bent
+        ngons = ~flat & (counts[polygons] > 3)
+        if ngons.any():
+            normals = areas / np.where(flat, 1, length)[:, None]
+            centers = np.add.reduceat(points, local[:-1]) / counts[polygons, None]
+            owner = np.repeat(np.arange(len(polygons)), counts[polygons])
+            distance = np.abs(((points - centers[owner]) * normals[owner]).sum(axis=1))
+            bent = np.maximum.reduceat(distance, local[:-1]) > tolerance[polygons]
+            kinds[polygons[ngons & bent]] = BENT
+
+        # Collapse polygons without area to the line between their extreme points
+        if flat.any():
+            keep = np.ones(len(vertices), dtype=bool)
+            for polygon in polygons[flat].tolist():
+                start, end = offsets[polygon], offsets[polygon + 1]
+                relative = vertices[start:end] - vertices[start]
+                direction = relative[np.argmax(np.abs(relative).sum(axis=1))]
+                along = relative @ direction
+                keep[start:end] = False
+                keep[start + np.argmin(along)] = keep[start + np.argmax(along)] = True
+            counts = np.add.reduceat(keep, offsets[:-1])
+            vertices = vertices[keep]
+            offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+
+    return vertices, offsets, kinds
+
+class PolygonStore:
+    """Stores polygons of varying arity (lines, triangles, quads, ...) in flat arrays\n
+        Vertices live in a single (n, 3) buffer and each polygon is a start/count pair into it,
+        so memory per vertex is 3 floats plus a few bytes per polygon for attributes.
+        Polygons are referred to by integer handles, which stay valid until removed
+    """
+
+    # Fraction of the vertex buffer left unused by removed or moved polygons that triggers
+    # compaction, however the store is read
+    COMPACT_FRACTION = 0.5
+
+    def __init__(self, dtype=np.float64):
+
+        # Flat vertex buffer, of which the first _vertexCount rows are used
+        self._vertices = np.empty((0, 3), dtype=dtype)
+        self._vertexCount = 0
+
+        # Per-polygon (per-handle) attributes, of which the first _handleCount rows are used
+        self._start = np.empty(0, dtype=np.intp)
+        self._count = np.empty(0, dtype=np.intp)
+        self._color = np.empty((0, 3), dtype=np.uint8)
+        self._kind = np.empty(0, dtype=np.uint8)
+        self._cull = np.empty(0, dtype=bool)
+        self._alive = np.empty(0, dtype=bool)
+        self._handleCount = 0
+        self._live = 0
+
+        # Whether live polygons are laid out back to back in handle order with no gaps
+        self._packed = True
+        # Number of vertex rows no longer used by any live polygon
+        self._dead = 0
+
+        # Incremented whenever the stored polygons change, so derived data can be invalidated
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes used by the allocated buffers"""
+        return sum(array.nbytes for array in (
+            self._vertices, self._start, self._count, self._color, self._kind, self._cull,
+            self._alive
+        ))
+
+    def _reserve(self, vertices: int, handles: int) -> None:
+        """Ensures capacity for the given number of additional vertices and handles"""
+        self._vertices = _grow(self._vertices, self._vertexCount + vertices)
+        needed = self._handleCount + handles
+        self._start = _grow(self._start, needed)
+        self._count = _grow(self._count, needed)
+        self._color = _grow(self._color, needed)
+        self._kind = _grow(self._kind, needed)
+        self._cull = _grow(self._cull, needed)
+        self._alive = _grow(self._alive, needed)
+
+    def _append_vertices(self, points: np.ndarray) -> int:
+        """Appends rows to the vertex buffer, returning the index of the first"""
+        start = self._vertexCount
+        self._vertices = _grow(self._vertices, start + len(points))
+        self._vertices[start:start + len(points)] = points
+        self._vertexCount += len(points)
+        return start
+
+    def add_polygon(self, points: typing.Sequence, color: Color) -> int:
+        """Adds a single polygon of any arity, returning its handle"""
+        return int(self.add_polygons(np.asarray(points, dtype=float)[None], color)[0])
+
+    def add_polygons(self, points: np.ndarray,
+                     colors: typing.Union[Color, np.ndarray]) -> np.ndarray:
+        """Adds polygons from an (n, k, 3) array of n polygons with k points each
+        Colors can be a single color or an (n, 3) array, returns the array of new handles
+        """
+        return self.add_mesh(Mesh.from_polygons(points, colors))
+
+    def add_mesh(self, mesh: Mesh) -> np.ndarray:
+        """Adds every polygon of a Mesh, of any mix of arities, returning their new handles
+        Polygons are classified first, so degenerate ones are stored collapsed
+        """
+        mesh = mesh.classified()
+        counts = np.diff(mesh.offsets)
+        number = len(counts)
+
+        self._reserve(len(mesh.vertices), number)
+
+        # Copy the vertices in as one contiguous block
+        start = self._append_vertices(mesh.vertices[mesh.offsets[0]:mesh.offsets[-1]])
+
+        # Fill in the per-polygon attributes
+        handles = np.arange(self._handleCount, self._handleCount + number)
+        self._start[handles] = start + mesh.offsets[:-1] - mesh.offsets[0]
+        self._count[handles] = counts
+        self._color[handles] = mesh.colors
+        self._kind[handles] = mesh.kinds
+        self._cull[handles] = False if mesh.cull is None else mesh.cull
+        self._alive[handles] = True
+        self._handleCount += number
+        self._live += number
+        self.version += 1
+
+        return handles
+
+    def _check(self, handle: int) -> None:
+        """Raises KeyError if the handle does not refer to a live polygon"""
+        if not 0 <= handle < self._handleCount or not self._alive[handle]:
+            raise KeyError(f"No polygon with handle {handle}")
+
+    def remove(self, handle: int) -> None:
+        """Removes the polygon with the given handle"""
+        self._check(handle)
+        self._alive[handle] = False
+        self._live -= 1
+        self._packed = False
+        self._dead += self._count[handle]
+        self._reclaim()
+        self.version += 1
+
+    def update(self, handle: int, points: typing.Sequence = None, color: Color = None) -> None:
+        """Replaces the points and/or color of the polygon with the given handle"""
+        self._check(handle)
+        if points is not None:
+            points = np.asarray(points, dtype=float).reshape(-1, 3)
+            points, _, kinds = classify(points, (0, len(points)))
+            self._kind[handle] = kinds[0]
+            if len(points) == self._count[handle]:
+                # Same arity so overwrite in place
+                start = self._start[handle]
+                self._vertices[start:start + len(points)] = points
+            else:
+                # Different arity so move to the end of the buffer
+                self._dead += self._count[handle]
+                self._start[handle] = self._append_vertices(points)
+                self._count[handle] = len(points)
+                self._packed = False
+                self._reclaim()
+        if color is not None:
+            self._color[handle] = color
+        self.version += 1
+
+    def polygon(self, handle: int) -> np.ndarray:
+        """Returns a (k, 3) view of the points of the polygon with the given handle"""
+        self._check(handle)
+        start = self._start[handle]
+        return self._vertices[start:start + self._count[handle]]
+
+    def color(self, handle: int) -> Color:
+        """Returns the color of the polygon with the given handle"""
+        self._check(handle)
+        return tuple(int(channel) for channel in self._color[handle])
+
+    def gather(self, handles: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns (vertices, offsets) of the given live handles, copied back to back in one pass
+        Polygon i has the points vertices[offsets[i]:offsets[i + 1]]
+        """
+        gather, offsets = ranges(self._start[handles], self._count[handles])
+        return self._vertices[gather], offsets
+
+    def compact(self) -> None:
+        """Rewrites the vertex buffer so live polygons are back to back in handle order"""
+        if self._packed:
+            return
+        handles = np.flatnonzero(self._alive[:self._handleCount])
+        self._vertices, offsets = self.gather(handles)
+        self._vertexCount = len(self._vertices)
+        self._start[handles] = offsets[:-1]
+        self._packed = True
+        self._dead = 0
+
+    def _reclaim(self) -> None:
+        """Compacts the vertex buffer once enough of it is unused"""
+        if self._dead > self.COMPACT_FRACTION * self._vertexCount:
+            self.compact()
+
+    def packed(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns (vertices, offsets, handles) describing every live polygon
+        Polygon i has the points vertices[offsets[i]:offsets[i + 1]] and the handle handles[i]
+        Returned arrays are views and must not be modified
+        """
+        self.compact()
+        handles = np.flatnonzero(self._alive[:self._handleCount])
+        offsets = np.empty(len(handles) + 1, dtype=np.intp)
+        offsets[:-1] = self._start[handles]
+        offsets[-1] = self._vertexCount
+        return self._vertices[:self._vertexCount], offsets, handles
+
+    def colors(self, handles: np.ndarray) -> np.ndarray:
+        """Returns the (n, 3) colors of the given handles"""
+        return self._color[handles]
+
+    def kinds(self, handles: np.ndarray) -> np.ndarray:
+        """Returns the kinds of primitive of the given handles"""
+        return self._kind[handles]
+
+    def cull(self, handles: np.ndarray) -> np.ndarray:
+        """Returns whether each of the given handles is hidden when facing away"""
+        return self._cull[handles]
+
+class Mesh:
+    """Polygons of varying arity in flat arrays, in the layout used by the render pipeline\n
+        Polygon i has the points vertices[offsets[i]:offsets[i + 1]] and the color colors[i]
+    """
+
+    def __init__(self, vertices: np.ndarray, offsets: np.ndarray, colors: np.ndarray,
+                 kinds: np.ndarray = None, cull: np.ndarray = None,
+                 boxes: typing.Tuple[np.ndarray, np.ndarray] = None):
+        self.vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        self.colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        # Kind of each polygon, or None if the Mesh has not been classified
+        self.kinds = None if kinds is None else np.asarray(kinds, dtype=np.uint8)
+        # Whether each polygon is hidden when facing away, or None if none are
+        self.cull = None if cull is None else np.asarray(cull, dtype=bool)
+        # Known (n, 3) minimum and maximum corners of each polygon, or None to compute them
+        self._boxes = boxes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_polygons(cls, points: np.ndarray, colors: typing.Union[Color, np.ndarray]) -> Mesh:
+        """Returns a Mesh of an (n, k, 3) array of n polygons with k points each
+        Colors can be a single color or an (n, 3) array
+        """
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 3 or points.shape[2] != 3:
+            raise ValueError(f"Expected an (n, k, 3) array of polygons, got shape {points.shape}")
+        number, arity = points.shape[:2]
+        return cls(
+            points.reshape(-1, 3), np.arange(number + 1) * arity,
+            np.broadcast_to(np.asarray(colors, dtype=np.uint8), (number, 3))
+        )
+
+    @classmethod
+    def empty(cls) -> Mesh:
+        """Returns a Mesh without any polygons"""
+        return cls(np.empty((0, 3)), np.zeros(1, dtype=np.intp), np.empty((0, 3)), np.empty(0))
+
+    def classified(self) -> Mesh:
+        """Returns the Mesh with degenerate polygons collapsed and kinds known, see classify"""
+        if self.kinds is not None:
+            return self
+        vertices, offsets, kinds = classify(self.vertices, self.offsets)
+        return Mesh(vertices, offsets, self.colors.copy(), kinds, self.cull)
+
+    def closed(self) -> Mesh:
+        """Returns the Mesh marked as a closed surface, so faces turned away are culled
+        Front faces wind counterclockwise when seen from outside
+        """
+        return Mesh(
+            self.vertices, self.offsets, self.colors, self.kinds, np.ones(len(self), dtype=bool)
+        )
+
+    def select(self, indices: np.ndarray) -> Mesh:
+        """Returns the polygons at the given indices (or mask), back to back in that order"""
+        indices = np.arange(len(self))[indices]
+        gather, offsets = ranges(self.offsets[indices], np.diff(self.offsets)[indices])
+        return Mesh(
+            self.vertices[gather], offsets, self.colors[indices],
+            None if self.kinds is None else self.kinds[indices],
+            None if self.cull is None else self.cull[indices],
+        )
+
+    def bounds(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the minimum and maximum corners of the box around every vertex"""
+        return self.vertices.min(axis=0), self.vertices.max(axis=0)
+
+    def boxes(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (n, 3) minimum and maximum corners of the box around each polygon"""
+        if self._boxes is None:
+            if not len(self):
+                return np.empty((0, 3)), np.empty((0, 3))
+            vertices, starts = self.vertices[:self.offsets[-1]], self.offsets[:-1]
+            self._boxes = (
+                np.minimum.reduceat(vertices, starts), np.maximum.reduceat(vertices, starts)
+            )
+        return self._boxes
+
+    @staticmethod
+    def join(meshes: typing.Sequence[Mesh]) -> Mesh:
+        """Returns the concatenation of several Meshes"""
+        meshes = [mesh for mesh in meshes if len(mesh)]
+        if len(meshes) == 1:
+            return meshes[0]
+        if not meshes:
+            return Mesh.empty()
+        offsets = [np.zeros(1, dtype=np.intp)]
+        total = 0
+        for mesh in meshes:
+            offsets.append(mesh.offsets[1:] + total)
+            total += mesh.offsets[-1]
+        kinds = [mesh.kinds for mesh in meshes]
+        cull = None
+        if any(mesh.cull is not None for mesh in meshes):
+            cull = np.concatenate([
+                np.zeros(len(mesh), dtype=bool) if mesh.cull is None else mesh.cull
+                for mesh in meshes
+            ])
+        return Mesh(
+            np.concatenate([mesh.vertices for mesh in meshes]),
+            np.concatenate(offsets),
+            np.concatenate([mesh.colors for mesh in meshes]),
+            None if any(kind is None for kind in kinds) else np.concatenate(kinds),
+            cull,
+        )
+
+class Instances:
+    """Copies of one shared Mesh, each placed by a scale, translation and optional rotation\n
+        Each instance costs 4 floats (plus 9 more once any instance is rotated),
+        and is only expanded into vertices while gathering polygons to draw.
+        Instances are referred to by integer handles, which stay valid until removed
+    """
+
+    def __init__(self, mesh: Mesh, index: spatial.Octree = None):
+
+        # Geometry shared by every instance, in local coordinates
+        self.mesh = mesh.classified()
+        mesh = self.mesh
+        # Local box around the mesh, as a center and half extents
+        lo, hi = mesh.bounds() if len(mesh.vertices) else (np.zeros(3), np.zeros(3))
+        self._center = (lo + hi) / 2
+        self._extent = (hi - lo) / 2
+
+        # Optional spatial index of instance bounds, used to skip instances outside the view
+        self.index = index
+
+        # Per-instance (x, y, z, scale) and rotation, of which the first _handleCount rows are used
+        self._placement = np.empty((0, 4))
+        self._rotation: typing.Optional[np.ndarray] = None
+        self._alive = np.empty(0, dtype=bool)
+        self._handleCount = 0
+        self._live = 0
+
+        # Incremented whenever the instances change, so renders can be cached
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes used by the allocated per-instance buffers"""
+        rotation = 0 if self._rotation is None else self._rotation.nbytes
+        return self._placement.nbytes + self._alive.nbytes + rotation
+
+    def _check(self, handle: int) -> None:
+        """Raises KeyError if the handle does not refer to a live instance"""
+        if not 0 <= handle < self._handleCount or not self._alive[handle]:
+            raise KeyError(f"No instance with handle {handle}")
+
+    def _rotate(self, handles: np.ndarray, rotations: np.ndarray) -> None:
+        """Sets the rotation matrices of the given handles, allocating rotations when first used"""
+        if self._rotation is None:
+            self._rotation = np.zeros((len(self._placement), 3, 3))
+            self._rotation[:] = np.eye(3)
+        self._rotation = _grow(self._rotation, len(self._placement))
+        self._rotation[handles] = rotations
+
+    def add(self, translations: np.ndarray, scales: typing.Union[float, np.ndarray] = 1,
+            rotations: np.ndarray = None) -> np.ndarray:
+        """Adds instances at an (n, 3) array of translations, returning their handles
+        Scales can be a single value or n values, and rotations an (n, 3, 3) array of matrices
+        """
+        translations = np.asarray(translations, dtype=float).reshape(-1, 3)
+        number = len(translations)
+        handles = np.arange(self._handleCount, self._handleCount + number)
+
+        self._placement = _grow(self._placement, self._handleCount + number)
+        self._alive = _grow(self._alive, self._handleCount + number)
+        self._placement[handles, :3] = translations
+        self._placement[handles, 3] = scales
+        self._alive[handles] = True
+        if self._rotation is not None or rotations is not None:
+            self._rotate(handles, np.eye(3) if rotations is None else rotations)
+        self._handleCount += number
+        self._live += number
+        self.version += 1
+
+        self._index(handles)
+        return handles
+
+    def remove(self, handle: int) -> None:
+        """Removes the instance with the given handle"""
+        self._check(handle)
+        self._alive[handle] = False
+        self._live -= 1
+        self.version += 1
+        if self.index is not None:
+            self.index.remove(np.array([handle]))
+
+    def update(self, handle: int, translation: typing.Sequence = None, scale: float = None,
+               rotation: np.ndarray = None) -> None:
+        """Replaces the translation, scale and/or rotation matrix of the instance with a handle"""
+        self._check(handle)
+        if translation is not None:
+            self._placement[handle, :3] = translation
+        if scale is not None:
+            self._placement[handle, 3] = scale
+        if rotation is not None:
+            self._rotate(np.array([handle]), rotation)
+        self.version += 1
+        self._index(np.array([handle]))
+
+    def _index(self, handles: np.ndarray) -> None:
+        """Inserts (or moves) the bounds of the given handles in the spatial index"""
+        if self.index is not None and len(handles):
+            self.index.insert(handles, *self.bounds(handles))
+
+    def bounds(self, handles: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the (n, 3) minimum and maximum corners of boxes around the given instances"""
+        translations, scales = self._placement[handles, :3], self._placement[handles, 3]
+        if self._rotation is None:
+            center = self._center * scales[:, None] + translations
+            extent = self._extent * np.abs(scales)[:, None]
+        else:
+            matrices = self._rotation[handles] * scales[:, None, None]
+            center = matrices @ self._center + translations
+            extent = np.abs(matrices) @ self._extent
+        return center - extent, center + extent
+
+    def live(self) -> np.ndarray:
+        """Returns the handles of every live instance"""
+        return np.flatnonzero(self._alive[:self._handleCount])
+
+    def visible(self, normals: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Returns the sorted handles of instances that may be inside the convex volume,
+        or the union of stacked volumes as for Octree.query.
+        Without a spatial index this is every live instance
+        """
+        if self.index is None:
+            return self.live()
+        return self.index.query(normals, offsets)
+
+    def expand(self, handles: np.ndarray) -> Mesh:
+        """Returns the world-space polygons of the given instances, one copy of the mesh each"""
+        handles = np.asarray(handles, dtype=np.intp)
+        mesh = self.mesh
+        translations, scales = self._placement[handles, :3], self._placement[handles, 3]
+
+        # Transform every copy of the shared vertices at once
+        if self._rotation is None:
+            vertices = mesh.vertices * scales[:, None, None] + translations[:, None]
+        else:
+            matrices = self._rotation[handles] * scales[:, None, None]
+            vertices = mesh.vertices @ matrices.transpose(0, 2, 1) + translations[:, None]
+
+        # Repeat the mesh layout for each copy
+        size = len(mesh.vertices)
+        offsets = (mesh.offsets[:-1] + size * np.arange(len(handles))[:, None]).ravel()
+        return Mesh(
+            vertices.reshape(-1, 3), np.append(offsets, size * len(handles)),
+            np.tile(mesh.colors, (len(handles), 1)), np.tile(mesh.kinds, len(handles)),
+            None if mesh.cull is None else np.tile(mesh.cull, len(handles))
+        )
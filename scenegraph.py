@@ -0,0 +1,257 @@
+"""Hierarchy of positioned meshes, so moving objects does not mean rewriting their geometry"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+import scene
+
+def _rotation_matrix(rotation) -> np.ndarray:
+    """Returns a 3x3 matrix from a Rotation (anything with a matrix method) or a matrix"""
+    if rotation is None:
+        return np.eye(3)
+    if hasattr(rotation, "matrix"):
+        rotation = rotation.matrix()
+    return np.array(rotation, dtype=float).reshape(3, 3)
+
+class Node:
+    """A mesh placed by a rotation and translation relative to its parent\n
+        World transforms are cached, and only recomputed after the node or an ancestor moves.
+        Meshes are in local coordinates and should be replaced rather than modified in place
+    """
+
+    def __init__(self, mesh: scene.Mesh = None, rotation=None, translation=(0, 0, 0)):
+
+        # Hierarchy
+        self.parent: typing.Optional[Node] = None
+        self.children: typing.List[Node] = []
+        # Graph this node is part of, if any
+        self._graph: typing.Optional[SceneGraph] = None
+
+        # Geometry, classified once, and local transform
+        self._mesh = None if mesh is None else mesh.classified()
+        self._rotation = _rotation_matrix(rotation)
+        self._translation = np.array(translation, dtype=float).reshape(3)
+
+        # Cached 4x4 world transform, None when it must be recomputed
+        self._world: typing.Optional[np.ndarray] = None
+
+    @property
+    def mesh(self) -> typing.Optional[scene.Mesh]:
+        """Geometry of this node in local coordinates"""
+        return self._mesh
+
+    @mesh.setter
+    def mesh(self, mesh: typing.Optional[scene.Mesh]) -> None:
+        self._mesh = None if mesh is None else mesh.classified()
+        self._restructure()
+
+    @property
+    def rotation(self) -> np.ndarray:
+        """3x3 rotation matrix relative to the parent, can be set from a Rotation"""
+        return self._rotation
+
+    @rotation.setter
+    def rotation(self, rotation) -> None:
+        self._rotation = _rotation_matrix(rotation)
+        self.invalidate()
+
+    @property
+    def translation(self) -> np.ndarray:
+        """Position relative to the parent"""
+        return self._translation
+
+    @translation.setter
+    def translation(self, translation) -> None:
+        self._translation = np.array(translation, dtype=float).reshape(3)
+        self.invalidate()
+
+    def move(self, offset) -> None:
+        """Translates the node by the given offset"""
+        self.translation = self._translation + np.asarray(offset, dtype=float)
+
+    def local(self) -> np.ndarray:
+        """Returns the 4x4 transform from this node's coordinates to its parent's"""
+        matrix = np.eye(4)
+        matrix[:3, :3] = self._rotation
+        matrix[:3, 3] = self._translation
+        return matrix
+
+    def world(self) -> np.ndarray:
+        """Returns the 4x4 transform from this node's coordinates to world coordinates"""
+        if self._world is None:
+            if self.parent is None:
+                self._world = self.local()
+            else:
+                self._world = self.parent.world() @ self.local()
+        return self._world
+
+    def invalidate(self) -> None:
+        """Marks the world transform of this node and its descendants as out of date"""
+        # Nodes of a tree manage each other's cached state, which is private to the tree
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            # Descendants of an invalid node are never valid, so the walk can stop there
+            if node._world is None and node is not self: #pylint: disable=protected-access
+                continue
+            node._world = None #pylint: disable=protected-access
+            if node._graph is not None: #pylint: disable=protected-access
+                node._graph.moved(node) #pylint: disable=protected-access
+            stack.extend(node.children)
+
+    def walk(self) -> typing.Iterator[Node]:
+        """Yields this node and every descendant, parents before children"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def add(self, child: Node) -> Node:
+        """Attaches a node (and its descendants) as a child of this one, returning it"""
+        if child.parent is not None:
+            child.parent.remove(child)
+        child.parent = self
+        self.children.append(child)
+        child._attach(self._graph) #pylint: disable=protected-access
+        child.invalidate()
+        return child
+
+    def remove(self, child: Node) -> None:
+        """Detaches a child node (and its descendants) from this one"""
+        self.children.remove(child)
+        child.parent = None
+        child._attach(None) #pylint: disable=protected-access
+        child.invalidate()
+        self._restructure()
+
+    def _attach(self, graph: typing.Optional[SceneGraph]) -> None:
+        """Sets the graph of this node and its descendants"""
+        for node in self.walk():
+            node._graph = graph #pylint: disable=protected-access
+        self._restructure()
+
+    def _restructure(self) -> None:
+        """Notifies the graph that the set of meshes has changed"""
+        if self._graph is not None:
+            self._graph.restructure()
+
+class SceneGraph:
+    """Tree of Nodes flattened into a single world-space Mesh for rendering\n
+        The flattened geometry is kept between frames, and only the vertices of nodes
+        that moved are rewritten, with one matrix product per node
+    """
+
+    def __init__(self):
+
+        # Incremented whenever anything in the graph changes, so renders can be cached
+        self.version = 0
+
+        # Whether the flattened layout must be rebuilt, and the nodes moved since the last flatten
+        self._restructured = True
+        self._moved: typing.Set[Node] = set()
+
+        # Flattened world-space geometry of every node with a mesh
+        self._flat = scene.Mesh.empty()
+        # Nodes in the layout, with their vertex and polygon ranges and world bounds
+        self._nodes: typing.List[Node] = []
+        self._slot: typing.Dict[Node, int] = {}
+        self._vertexOffsets = np.zeros(1, dtype=np.intp)
+        self._polygonOffsets = np.zeros(1, dtype=np.intp)
+        self._lo = np.empty((0, 3))
+        self._hi = np.empty((0, 3))
+
+        # Root node, which is placed at the world origin by default
+        self.root = Node()
+        self.root._attach(self) #pylint: disable=protected-access
+
+    def __len__(self) -> int:
+        """Number of polygons across every node"""
+        self._update()
+        return len(self._flat)
+
+    def add(self, node: Node) -> Node:
+        """Attaches a node to the root, returning it"""
+        return self.root.add(node)
+
+    def moved(self, node: Node) -> None:
+        """Records that the world transform of a node has changed"""
+        self._moved.add(node)
+        self.version += 1
+
+    def restructure(self) -> None:
+        """Records that nodes or meshes were added, removed or replaced"""
+        self._restructured = True
+        self.version += 1
+
+    def _layout(self) -> None:
+        """Allocates the flattened geometry for every node currently holding a mesh"""
+        self._nodes = [node for node in self.root.walk() if node.mesh is not None
+                       and len(node.mesh)]
+        self._slot = {node: slot for slot, node in enumerate(self._nodes)}
+        meshes = [node.mesh for node in self._nodes]
+        self._vertexOffsets = np.zeros(len(meshes) + 1, dtype=np.intp)
+        np.cumsum([len(mesh.vertices) for mesh in meshes], out=self._vertexOffsets[1:])
+        self._polygonOffsets = np.zeros(len(meshes) + 1, dtype=np.intp)
+        np.cumsum([len(mesh) for mesh in meshes], out=self._polygonOffsets[1:])
+
+        # Local offsets and colors never change, only the vertices are rewritten when nodes move
+        joined = scene.Mesh.join(meshes)
+        self._flat = scene.Mesh(
+            joined.vertices.copy(), joined.offsets, joined.colors, joined.kinds, joined.cull
+        )
+        self._lo = np.empty((len(meshes), 3))
+        self._hi = np.empty((len(meshes), 3))
+
+        self._restructured = False
+        self._moved = set(self._nodes)
+
+    def _update(self) -> None:
+        """Brings the flattened geometry up to date with the nodes"""
+        if self._restructured:
+            self._layout()
+        for node in self._moved:
+            slot = self._slot.get(node)
+            if slot is None:
+                continue
+            # Transform the local vertices of the node into place in one product
+            world = node.world()
+            vertices = node.mesh.vertices @ world[:3, :3].T + world[:3, 3]
+            self._flat.vertices[self._vertexOffsets[slot]:self._vertexOffsets[slot + 1]] = vertices
+            self._lo[slot] = vertices.min(axis=0)
+            self._hi[slot] = vertices.max(axis=0)
+        self._moved.clear()
+
+    def flatten(self) -> scene.Mesh:
+        """Returns the world-space geometry of every node as one Mesh
+        The returned arrays are reused between calls and must not be modified
+        """
+        self._update()
+        return self._flat
+
+    def visible(self, normals: np.ndarray, offsets: np.ndarray) -> scene.Mesh:
+        """Returns the world-space geometry of nodes whose bounds may be inside the convex volume
+        The volume is the intersection of the half-spaces normal . p + offset >= 0.
+        Stacked (v, k, 3) normals and (v, k) offsets test against the union of v volumes
+        """
+        self._update()
+        if not self._nodes:
+            return self._flat
+        normals = np.asarray(normals, dtype=float).reshape(-1, np.shape(normals)[-2], 3)
+        offsets = np.asarray(offsets, dtype=float).reshape(len(normals), 1, -1)
+        # Test the bounding box of every node against every plane of every volume at once
+        centers = (self._lo + self._hi) / 2
+        radii = (self._hi - self._lo) / 2
+        distance = centers @ normals.transpose(0, 2, 1) + offsets
+        reach = radii @ np.abs(normals).transpose(0, 2, 1)
+        inside = (~(distance + reach < 0).any(axis=2)).any(axis=0)
+        if inside.all():
+            return self._flat
+        slots = np.flatnonzero(inside)
+        polygons, _ = scene.ranges(
+            self._polygonOffsets[slots], np.diff(self._polygonOffsets)[slots]
+        )
+        return self._flat.select(polygons)
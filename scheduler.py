@@ -0,0 +1,56 @@
+"""Fixed timestep scheduling of Model updates, decoupled from rendering"""
+
+from __future__ import annotations
+
+import time
+import typing
+
+class Scheduler:
+    """Decides how many fixed timestep updates to run each iteration of the main loop\n
+        Real time is accumulated and spent in whole steps, so simulation runs at the same rate
+        however fast frames are drawn. Under load several steps run before the next render,
+        up to maxSteps, and any backlog beyond that is dropped rather than chased forever
+    """
+
+    def __init__(self, rate: float, maxSteps: int = 5,
+                 clock: typing.Callable[[], float] = time.perf_counter):
+
+        if rate <= 0:
+            raise ValueError("Update rate must be positive")
+        # Seconds of simulation per update
+        self.step = 1 / rate
+        self.maxSteps = maxSteps
+        self.clock = clock
+
+        # Real time not yet simulated, and when it was last measured
+        self._accumulator = 0.0
+        self._last: typing.Optional[float] = None
+
+        # Total simulated time dropped because updates could not keep up
+        self.dropped = 0.0
+
+    def advance(self) -> int:
+        """Returns the number of updates to run now to catch up with real time"""
+        now = self.clock()
+        if self._last is not None:
+            self._accumulator += now - self._last
+        self._last = now
+
+        steps = int(self._accumulator // self.step)
+        if steps > self.maxSteps:
+            # Too far behind, so give up on all but the fraction of a step in progress
+            self.dropped += (steps - self.maxSteps) * self.step
+            self._accumulator -= (steps - self.maxSteps) * self.step
+            steps = self.maxSteps
+        self._accumulator -= steps * self.step
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """Fraction of a step real time is past the latest update, for interpolating renders"""
+        return min(self._accumulator / self.step, 1.0)
+
+    def reset(self) -> None:
+        """Forgets accumulated time, such as after a pause"""
+        self._accumulator = 0.0
+        self._last = None
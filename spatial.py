@@ -0,0 +1,242 @@
+"""Spatial indexing of 3D geometry, used to cull polygons outside of an Observer's view"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy as np
+
+# Bits used for each cell coordinate in an encoded cell key, limiting the depth of the Octree
+_BITS = 11
+
+def _encode(level: np.ndarray, cells: np.ndarray) -> np.ndarray:
+    """Encodes levels and (n, 3) integer cell coordinates into single integer keys"""
+    cells = cells.astype(np.int64)
+    return (
+        (np.asarray(level, dtype=np.int64) << (3 * _BITS))
+        | (cells[..., 0] << (2 * _BITS)) | (cells[..., 1] << _BITS) | cells[..., 2]
+    )
+
+def _key(level: int, x: int, y: int, z: int) -> int:
+    """Encodes a single cell as a key, without going through arrays"""
+    return (level << (3 * _BITS)) | (x << (2 * _BITS)) | (y << _BITS) | z
+
+def _decode(key: int) -> typing.Tuple[int, int, int, int]:
+    """Returns the (level, x, y, z) encoded in a cell key"""
+    mask = (1 << _BITS) - 1
+    return key >> (3 * _BITS), (key >> (2 * _BITS)) & mask, (key >> _BITS) & mask, key & mask
+
+def _groups(keys: np.ndarray,
+            handles: np.ndarray) -> typing.Iterator[typing.Tuple[int, np.ndarray]]:
+    """Yields each distinct key with the handles that have it"""
+    order = np.argsort(keys, kind="stable")
+    unique, starts = np.unique(keys[order], return_index=True)
+    handles = handles[order]
+    ends = np.append(starts[1:], len(handles))
+    for key, start, end in zip(unique.tolist(), starts.tolist(), ends.tolist()):
+        yield key, handles[start:end]
+
+class Octree:
+    """Linear octree over axis-aligned bounding boxes, identified by integer handles\n
+        Each box is stored in the deepest cell that fully contains it,
+        so a cell outside a convex volume means everything stored beneath it is too.
+        Boxes are inserted in bulk with array operations, and the root grows as needed
+    """
+
+    def __init__(self, depth: int = 8):
+
+        if not 0 <= depth < _BITS:
+            raise ValueError(f"Octree depth must be between 0 and {_BITS - 1}")
+        self.depth = depth
+
+        # Root cube, determined by the first insertion
+        self._origin = None
+        self._size = None
+
+        # Bounds of every handle, and the key of the cell it is stored in (-1 if absent)
+        self._lo = np.empty((0, 3))
+        self._hi = np.empty((0, 3))
+        self._cell = np.empty(0, dtype=np.int64)
+
+        # Handles stored directly in each cell
+        self._items: typing.Dict[int, np.ndarray] = {}
+        # Number of handles stored in each cell or its descendants
+        self._population: typing.Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._cell >= 0))
+
+    def _levels(self, lo: np.ndarray, hi: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the deepest level and the cell at that level fully containing each box"""
+        # Cells of both corners at the deepest level, whose parents are found by shifting
+        divisions = 1 << self.depth
+        scale = divisions / self._size
+        low = np.clip(np.floor((lo - self._origin) * scale), 0, divisions - 1).astype(np.int64)
+        high = np.clip(np.floor((hi - self._origin) * scale), 0, divisions - 1).astype(np.int64)
+        # Corners share a cell down to the highest bit where any coordinate differs
+        differ = np.bitwise_or.reduce(low ^ high, axis=1)
+        level = self.depth - np.frexp(differ.astype(float))[1].astype(np.int64)
+        return level, low >> (self.depth - level)[:, None]
+
+    def _contains(self, lo: np.ndarray, hi: np.ndarray) -> bool:
+        """Returns whether every box is within the root cube"""
+        return bool(
+            (lo >= self._origin).all() and (hi <= self._origin + self._size).all()
+        )
+
+    def _fit_root(self, lo: np.ndarray, hi: np.ndarray) -> None:
+        """Sets the root cube to enclose the given boxes as well as every existing one"""
+        live = self._cell >= 0
+        low = np.vstack((lo, self._lo[live])).min(axis=0)
+        high = np.vstack((hi, self._hi[live])).max(axis=0)
+        # Double the previous size so repeated growth is amortized
+        size = max(float((high - low).max()) * 1.5, 1.0)
+        if self._size is not None:
+            size = max(size, self._size * 2)
+        self._origin = (low + high) / 2 - size / 2
+        self._size = size
+
+    def insert(self, handles: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> None:
+        """Inserts boxes given by (n, 3) minimum and maximum corners under the given handles
+        Handles already present are moved to their new bounds
+        """
+        handles = np.asarray(handles, dtype=np.intp)
+        lo = np.asarray(lo, dtype=float).reshape(-1, 3)
+        hi = np.asarray(hi, dtype=float).reshape(-1, 3)
+        if not len(handles):
+            return
+
+        # Forget the old location of reinserted handles
+        self.remove(handles[handles < len(self._cell)])
+
+        # Record bounds per handle
+        needed = int(handles.max()) + 1
+        if needed > len(self._cell):
+            capacity = max(needed, 2 * len(self._cell))
+            self._lo = np.resize(self._lo, (capacity, 3))
+            self._hi = np.resize(self._hi, (capacity, 3))
+            cell = np.full(capacity, -1, dtype=np.int64)
+            cell[:len(self._cell)] = self._cell
+            self._cell = cell
+        self._lo[handles] = lo
+        self._hi[handles] = hi
+
+        # Grow the root and reinsert everything when the boxes do not fit
+        if self._size is None or not self._contains(lo, hi):
+            self._fit_root(lo, hi)
+            live = np.flatnonzero(self._cell >= 0)
+            if len(live):
+                handles = np.union1d(live, handles)
+            self._clear()
+            lo, hi = self._lo[handles], self._hi[handles]
+
+        self._place(handles, lo, hi)
+
+    def _clear(self) -> None:
+        """Empties every cell, keeping recorded bounds"""
+        self._cell[:] = -1
+        self._items.clear()
+        self._population.clear()
+
+    def _place(self, handles: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> None:
+        """Stores handles in the deepest cells containing their boxes"""
+        level, cells = self._levels(lo, hi)
+        keys = _encode(level, cells)
+        self._cell[handles] = keys
+
+        # Group handles by cell so per-cell work is done once
+        for key, group in _groups(keys, handles):
+            items = self._items.get(key)
+            self._items[key] = group if items is None else np.concatenate((items, group))
+
+        self._populate(level, cells, 1)
+
+    def _populate(self, level: np.ndarray, cells: np.ndarray, sign: int) -> None:
+        """Adds sign to the population of every cell and ancestor of the given cells"""
+        # Filling an empty tree, as when loading, needs no merging with existing counts
+        fresh = sign > 0 and not self._population
+        for depth in range(self.depth + 1):
+            present = level >= depth
+            ancestors = _encode(depth, cells[present] >> (level[present, None] - depth))
+            unique, counts = np.unique(ancestors, return_counts=True)
+            if fresh:
+                self._population.update(zip(unique.tolist(), counts.tolist()))
+                continue
+            for key, count in zip(unique.tolist(), counts.tolist()):
+                population = self._population.get(key, 0) + sign * count
+                if population:
+                    self._population[key] = population
+                else:
+                    del self._population[key]
+
+    def remove(self, handles: np.ndarray) -> None:
+        """Removes the given handles, ignoring ones that are not present"""
+        handles = np.asarray(handles, dtype=np.intp).reshape(-1)
+        handles = handles[handles < len(self._cell)]
+        handles = handles[self._cell[handles] >= 0]
+        if not len(handles):
+            return
+
+        keys = self._cell[handles]
+        for key, group in _groups(keys, handles):
+            items = self._items[key]
+            items = items[~np.isin(items, group)]
+            if len(items):
+                self._items[key] = items
+            else:
+                del self._items[key]
+        self._cell[handles] = -1
+
+        level = keys >> (3 * _BITS)
+        mask = (1 << _BITS) - 1
+        cells = np.stack(
+            ((keys >> (2 * _BITS)) & mask, (keys >> _BITS) & mask, keys & mask), axis=1
+        )
+        self._populate(level, cells, -1)
+
+    def query(self, normals: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        """Returns the sorted handles of every box that may be inside the convex volume
+        The volume is the intersection of the half-spaces normal . p + offset >= 0.
+        Stacked (v, k, 3) normals and (v, k) offsets query the union of v volumes
+        """
+        if self._size is None or not self._population:
+            return np.empty(0, dtype=np.intp)
+
+        # Every volume is tested at once, so the tree is walked a single time
+        normals = np.asarray(normals, dtype=float).reshape(-1, np.shape(normals)[-2], 3)
+        offsets = np.asarray(offsets, dtype=float).reshape(len(normals), -1)
+        reach = np.abs(normals).sum(axis=2)
+
+        found = []
+        # Stack of (key, whether the cell is known to be fully inside a volume)
+        stack = [(_key(0, 0, 0, 0), False)]
+        while stack:
+            key, inside = stack.pop()
+            level, x, y, z = _decode(key)
+
+            if not inside:
+                # Test the cell cube against every plane, skipping it if outside every volume
+                half = self._size / (1 << (level + 1))
+                center = self._origin + (np.array((x, y, z)) * 2 + 1) * half
+                distance = normals @ center + offsets
+                radius = reach * half
+                if (distance + radius < 0).any(axis=1).all():
+                    continue
+                inside = bool((distance - radius >= 0).all(axis=1).any())
+
+            if key in self._items:
+                found.append(self._items[key])
+
+            # Visit populated children
+            if level < self.depth:
+                for corner in range(8):
+                    child = _key(
+                        level + 1,
+                        2 * x + (corner >> 2), 2 * y + ((corner >> 1) & 1), 2 * z + (corner & 1)
+                    )
+                    if child in self._population:
+                        stack.append((child, inside))
+
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(found))
@@ -1,38 +1,78 @@
 """Implementation of Stargon Model, and a related Manager"""
 
+import functools
 import math
+
+import numpy as np
 import pygame
 
 import base
 
+# Number of (radius, order) vertex sets, and of orders of unit circle tables, kept
+CACHE_SIZE = 16
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def unit_points(order: int) -> np.ndarray:
+    """Returns the (order, 2) read only points of an order sided polygon of radius 1,
+    starting at the top, so any radius is a single scale away
+    """
+    if order <= 0:
+        points = np.empty((0, 2))
+    else:
+        points = base.radial_array(1, np.arange(order) * (2*math.pi/order) + math.pi/2).array
+    points.setflags(write=False)
+    return points
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def segments(radius: float, order: int) -> np.ndarray:
+    """Returns the (order, 2, 2) read only lines of a Stargon,
+    each from a point to the second next
+    """
+    points = unit_points(order) * radius
+    lines = np.stack((points, np.roll(points, -2, axis=0)), axis=1)
+    lines.setflags(write=False)
+    return lines
+
 class Stargon(base.Model):
     """Represents the concave form of an 'order' sided polygon"""
 
     def __init__(self, radius, order):
+        # Delegate super init
+        super().__init__()
+
         # Reference parameters
         self.radius = radius
         self.order = order
 
-    def visual(self):
-        # Create a panel 2x the radius, and give it a central origin and standard orientation
-        drawing = base.Panel(
-            pygame.Surface((self.radius*2, self.radius*2)),
-            origin=base.Point(self.radius, self.radius), orientation=(1, -1)
+    def visual(self, panel=None):
+        # Get a panel 2x the radius, and give it a central origin and standard orientation
+        drawing = self.canvas(
+            (self.radius*2, self.radius*2),
+            origin=base.Point(self.radius, self.radius), orientation=(1, -1), panel=panel
         )
         # Draw each line of the stargon, reaching from a point to the second next point
-        for i in range(self.order):
-            drawing.draw_line(
-                base.radial(self.radius, i*2*math.pi/self.order + math.pi/2),
-                base.radial(self.radius, (i+2)*2*math.pi/self.order + math.pi/2)
-            )
+        drawing.draw_lines(segments(self.radius, self.order))
         # Return the panel
         return drawing
 
+    def fingerprint(self):
+        # Geometry only depends on the size and order
+        return (self.radius, self.order)
+
 class StargonManager(base.Manager):
     """Manager Class for the Stargon Model"""
 
-    def update(self, events, keyboard):
-        """UP/DOWN arrowkeys change order, Holding LEFT/RIGHT change size"""
+    def __init__(self, model: Stargon, screen: pygame.Surface):
+        # Delegate super init
+        super().__init__(model, screen)
+
+        # Fingerprint and screen area of the Stargon last drawn
+        self._shown = None
+        self._shownRect = None
+
+    def step(self, events, keyboard):
+        """Advances the Stargon, then UP/DOWN arrowkeys change order, LEFT/RIGHT change size"""
+        self.model.update()
 
         # Search for UP/DOWN
         for event in events:
@@ -52,13 +92,30 @@ class StargonManager(base.Manager):
         if keyboard[pygame.K_RIGHT]:
             self.model.radius += 1
 
+    def update(self, events, keyboard):
+        """Draws the Stargon in the middle of the screen, returning the changed rectangles"""
+
+        # Nothing to do if the screen already shows the current Stargon
+        fingerprint = self.model.fingerprint()
+        if self.valid and fingerprint == self._shown:
+            return []
+
         # Refresh the display
-        image = self.model.visual()
+        image = self.model.render()
         # Find blit coordinate to place in the middle
         # Reference both rects to manipulate them
         screenRect = self.screen.get_rect()
         imageRect = image.surface.get_rect()
         # Center imageRect on screenRect
         imageRect.center = screenRect.center
+
+        # Erase the previous image, which may have been larger
+        changed = [imageRect]
+        if self.valid and self._shownRect is not None:
+            self.screen.fill(self.background, self._shownRect)
+            changed.append(self._shownRect)
+
         # Draw the image, which should be centered
         image.display(self.screen, (imageRect.x, imageRect.y))
+        self._shown, self._shownRect, self.valid = fingerprint, imageRect, True
+        return changed